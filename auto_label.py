@@ -0,0 +1,114 @@
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+import json
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+
+# no Qt is imported anywhere on this path, it runs on servers without a display
+root_dir = os.path.dirname(os.path.abspath(__file__))
+
+img_exts = ('.dcm', '.jpg', '.jpeg', '.jpe', '.png')
+
+
+def get_img_paths(root: str, recursive: bool):
+    paths = []
+    for dir, dirs, names in os.walk(root):
+        dirs.sort()
+        paths.extend(os.path.join(dir, name) for name in sorted(names) if os.path.splitext(name)[1].lower() in img_exts)
+        if not recursive:
+            break
+    return paths
+
+
+def get_json_path(path: str, root: str, out_dir: Optional[str]):
+    json_path = os.path.splitext(path)[0] + '_pivots.json'
+    return os.path.join(out_dir, os.path.relpath(json_path, root)) if out_dir else json_path
+
+
+# the 8 bit image the app would feed the model: the first frame through its default window for DICOM
+# (RGB frames as BGR), as is otherwise
+# runs in the decoding processes
+def read_img(path: str):
+    if os.path.splitext(path)[1].lower() == '.dcm':
+        from module import dicom
+        return dicom.read_model_img(path)
+    import cv2
+    img = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
+    if img is None:
+        raise ValueError('not a readable image')
+    return img
+
+
+# decoded batches in order, the next prefetch batches are decoded while the current one is inferred
+def read_batches(executor: ProcessPoolExecutor, paths: List[str], batch_size: int, prefetch: int) \
+        -> Iterator[List[Tuple[str, Future]]]:
+    batches = [paths[i: i + batch_size] for i in range(0, len(paths), batch_size)]
+    pending: List[List[Tuple[str, Future]]] = []
+    for batch in batches:
+        pending.append([(path, executor.submit(read_img, path)) for path in batch])
+        if len(pending) > prefetch:
+            yield pending.pop(0)
+    yield from pending
+
+
+# the same file export_pivots writes: {"pivots": [[index, x, y], ...]}, indexs from 1, src coordinates
+def save_pivots(points, json_path: str, indent: int):
+    os.makedirs(os.path.dirname(os.path.abspath(json_path)), exist_ok=True)
+    data = dict(pivots=[(index, float(x), float(y)) for index, (x, y) in enumerate(points, 1)])
+    with open(json_path, 'w') as file:
+        json.dump(data, file, indent=indent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Label Dcm headless auto labeling')
+    parser.add_argument('dir', help='folder of .dcm / .jpg / .png files')
+    parser.add_argument('-r', '--recursive', action='store_true', help='walk sub folders too')
+    parser.add_argument('-o', '--out-dir', default=None, help='write json files here instead of next to the images')
+    parser.add_argument('-b', '--batch-size', type=int, default=8, help='images per forward pass')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='decoding processes')
+    parser.add_argument('--threads', type=int, default=None, help='torch threads')
+    parser.add_argument('--model', default=os.path.join(root_dir, 'static', 'model_best.pth'))
+    parser.add_argument('--overwrite', action='store_true', help='label images whose json already exists')
+    args = parser.parse_args()
+
+    from module.config import config
+    from model.test import InferenceSession
+
+    root = os.path.abspath(args.dir)
+    paths = [
+        path for path in get_img_paths(root, args.recursive)
+        if args.overwrite or not os.path.exists(get_json_path(path, root, args.out_dir))
+    ]
+    if not paths:
+        print('nothing to label')
+        return None
+    session = InferenceSession(args.model, num_threads=args.threads, batch_size=args.batch_size)
+
+    begin = time.perf_counter()
+    done = 0
+    failed = 0
+    with ProcessPoolExecutor(args.workers) as executor:
+        for batch in read_batches(executor, paths, args.batch_size, 2):
+            imgs = []
+            batch_paths = []
+            for path, future in batch:
+                try:
+                    imgs.append(future.result())
+                    batch_paths.append(path)
+                except Exception as error:
+                    failed += 1
+                    print(f'FAIL: {path}: {error}', file=sys.stderr)
+            if imgs:
+                for path, points in zip(batch_paths, session.predict_batch(imgs)):
+                    save_pivots(points, get_json_path(path, root, args.out_dir), config.indent)
+            done += len(batch)
+            print(f'{done} / {len(paths)}  {time.perf_counter() - begin:.1f}s', flush=True)
+    print(f'labeled {len(paths) - failed}, failed {failed}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
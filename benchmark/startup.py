@@ -0,0 +1,117 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be imported before the first window is shown
+heavy_modules = ('torch', 'cv2', 'pydicom', 'PIL')
+
+import_code = '''
+import sys
+import module.app
+print(','.join(name for name in {heavy} if name in sys.modules))
+'''
+
+window_code = '''
+import os
+import sys
+from PyQt5.QtWidgets import QApplication
+from module.app import LabelApp
+app = QApplication(sys.argv)
+label_app = LabelApp()
+label_app.show()
+app.processEvents()
+print('shown', flush=True)
+os._exit(0)
+'''
+
+
+def run_python(args: list, env: dict = None):
+    return subprocess.run(
+        [sys.executable, *args], cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+
+# python -X importtime: cumulative seconds of module.app and of each of its direct imports
+def measure_import_time():
+    result = run_python(['-X', 'importtime', '-c', import_code.format(heavy=heavy_modules)])
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    entries = []
+    for line in result.stderr.splitlines():
+        if match := re.match(r'import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)', line):
+            entries.append((len(match.group(2)) // 2, int(match.group(1)) / 1e6, match.group(3)))
+    total = 0
+    imports = []
+    for index, (depth, seconds, name) in enumerate(entries):
+        if depth == 0 and name == 'module.app':
+            total = seconds
+            for child_depth, child_seconds, child_name in reversed(entries[:index]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    imports.append((child_seconds, child_name))
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return total, sorted(imports, reverse=True), loaded
+
+
+# from process start to the first processed frame of the window, offscreen
+def measure_first_window():
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    begin = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', window_code], cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - begin
+    process.wait()
+    if line.strip() != 'shown':
+        raise RuntimeError(process.stderr.read())
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Label Dcm cold start benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level imports to list')
+    parser.add_argument('--import-budget', type=float, default=None, help='seconds for import module.app')
+    parser.add_argument('--window-budget', type=float, default=None, help='seconds to the first window')
+    args = parser.parse_args()
+
+    import_times = []
+    window_times = []
+    imports = []
+    loaded = []
+    for _ in range(args.runs):
+        total, imports, loaded = measure_import_time()
+        import_times.append(total)
+        window_times.append(measure_first_window())
+    import_time = statistics.median(import_times)
+    window_time = statistics.median(window_times)
+
+    print(f'import module.app: {import_time:.3f}s (median of {args.runs})')
+    for seconds, name in imports[:args.top]:
+        print(f'  {seconds:.3f}s  {name}')
+    print(f'first window: {window_time:.3f}s (median of {args.runs})')
+
+    failed = False
+    if loaded:
+        print(f'FAIL: heavy modules imported at startup: {", ".join(loaded)}')
+        failed = True
+    if args.import_budget is not None and import_time > args.import_budget:
+        print(f'FAIL: import time over budget {args.import_budget:.3f}s')
+        failed = True
+    if args.window_budget is not None and window_time > args.window_budget:
+        print(f'FAIL: first window over budget {args.window_budget:.3f}s')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
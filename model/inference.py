@@ -1,6 +1,8 @@
 from __future__ import absolute_import, division, print_function
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
 
 
 # 获得中心坐标作为关键点
@@ -53,43 +55,226 @@ def get_max_preds(batch_heatmaps):
 
 
 def taylor(hm, coord):
-    heatmap_height = hm.shape[0]
-    heatmap_width = hm.shape[1]
-    px = int(coord[0])
-    py = int(coord[1])
-    if 1 < px < heatmap_width - 2 and 1 < py < heatmap_height - 2:
-        dx = 0.5 * (hm[py][px + 1] - hm[py][px - 1])
-        dy = 0.5 * (hm[py + 1][px] - hm[py - 1][px])
-        dxx = 0.25 * (hm[py][px + 2] - 2 * hm[py][px] + hm[py][px - 2])
-        dxy = 0.25 * (hm[py + 1][px + 1] - hm[py - 1][px + 1] - hm[py + 1][px - 1] + hm[py - 1][px - 1])
-        dyy = 0.25 * (hm[py + 2 * 1][px] - 2 * hm[py][px] + hm[py - 2 * 1][px])
-        derivative = np.matrix([[dx], [dy]])
-        hessian = np.matrix([[dxx, dxy], [dxy, dyy]])
-        if dxx * dyy - dxy ** 2 != 0:
-            hessianinv = hessian.I
-            offset = -hessianinv * derivative
-            offset = np.squeeze(np.array(offset.T), axis=0)
-            coord += offset
+    coord[:] = batch_taylor(hm[np.newaxis, np.newaxis], coord[np.newaxis, np.newaxis])[0, 0]
     return coord
 
 
+# 所有关键点一起做泰勒展开：在 (px, py) 处用中心差分求梯度和 Hessian，偏移为 -H^-1 · g
+# 2×2 矩阵直接按公式求逆，边界上或 Hessian 奇异的点保持不变
+def batch_taylor(batch_heatmaps, coords):
+    """
+    batch_heatmaps: numpy.ndarray([batch_size, num_joints, height, width])，取过对数的热图
+    coords: numpy.ndarray([batch_size, num_joints, 2])
+    """
+    batch_size, num_joints, height, width = batch_heatmaps.shape
+    px = coords[..., 0].astype(np.int64)
+    py = coords[..., 1].astype(np.int64)
+    valid = (1 < px) & (px < width - 2) & (1 < py) & (py < height - 2)
+    px = np.clip(px, 2, width - 3)
+    py = np.clip(py, 2, height - 3)
+    n = np.arange(batch_size)[:, np.newaxis]
+    j = np.arange(num_joints)[np.newaxis, :]
+
+    def at(dy, dx):
+        return batch_heatmaps[n, j, py + dy, px + dx].astype(np.float64)
+
+    return apply_taylor(coords, at, valid)
+
+
+# at(dy, dx): 每个关键点 (py + dy, px + dx) 处取过对数的值
+def apply_taylor(coords, at, valid):
+    center = at(0, 0)
+    dx = 0.5 * (at(0, 1) - at(0, -1))
+    dy = 0.5 * (at(1, 0) - at(-1, 0))
+    dxx = 0.25 * (at(0, 2) - 2 * center + at(0, -2))
+    dxy = 0.25 * (at(1, 1) - at(-1, 1) - at(1, -1) + at(-1, -1))
+    dyy = 0.25 * (at(2, 0) - 2 * center + at(-2, 0))
+    det = dxx * dyy - dxy ** 2
+    valid = valid & (det != 0)
+    det = np.where(valid, det, 1)
+    offset = np.stack([dxy * dy - dyy * dx, dxy * dx - dxx * dy], axis=-1) / det[..., np.newaxis]
+    return coords + np.where(valid[..., np.newaxis], offset, 0).astype(coords.dtype)
+
+
+# 每个关键点周围 (2 radius + 1)² 的一块，超出热图的部分为 0
+def get_patches(batch_heatmaps, coords, radius):
+    batch_size, num_joints, height, width = batch_heatmaps.shape
+    offsets = np.arange(-radius, radius + 1)
+    rows = coords[..., 1].astype(np.int64)[..., np.newaxis] + offsets
+    cols = coords[..., 0].astype(np.int64)[..., np.newaxis] + offsets
+    inside = ((0 <= rows) & (rows < height))[..., :, np.newaxis] & ((0 <= cols) & (cols < width))[..., np.newaxis, :]
+    n = np.arange(batch_size)[:, np.newaxis, np.newaxis, np.newaxis]
+    j = np.arange(num_joints)[np.newaxis, :, np.newaxis, np.newaxis]
+    rows = np.clip(rows, 0, height - 1)[..., :, np.newaxis]
+    cols = np.clip(cols, 0, width - 1)[..., np.newaxis, :]
+    return np.where(inside, batch_heatmaps[n, j, rows, cols], 0).astype(np.float64)
+
+
+# 只在关键点周围做模糊、取对数和泰勒展开
+# 泰勒展开只用到 5×5 的邻域，其模糊值只依赖外扩 border 的一块，块上的 valid 卷积正好得到这 5×5
+# 按原最大值缩放在对数下是常数项，求导后抵消，因此省去
+# 块上有不大于 0 的模糊值时，截断到 1e-10 和缩放的符号不再抵消，这些关键点改在整张热图上计算
+def local_taylor(batch_heatmaps, coords, kernel):
+    """
+    batch_heatmaps: numpy.ndarray([batch_size, num_joints, height, width])，原始热图
+    coords: numpy.ndarray([batch_size, num_joints, 2])，get_max_preds 得到的坐标
+    """
+    height, width = batch_heatmaps.shape[2:]
+    px = coords[..., 0].astype(np.int64)
+    py = coords[..., 1].astype(np.int64)
+    valid = (1 < px) & (px < width - 2) & (1 < py) & (py < height - 2)
+
+    weights = cv2.getGaussianKernel(kernel, 0).ravel()
+    patches = get_patches(batch_heatmaps, coords, 2 + (kernel - 1) // 2)
+    rows = sum(weight * patches[..., :, k: k + 5] for k, weight in enumerate(weights))
+    blurred = sum(weight * rows[..., k: k + 5, :] for k, weight in enumerate(weights))
+    hm = np.log(np.maximum(blurred, 1e-10))
+
+    def at(dy, dx):
+        return hm[..., 2 + dy, 2 + dx]
+
+    preds = apply_taylor(coords, at, valid)
+    n, j = np.nonzero(valid & (blurred <= 0).any(axis=(2, 3)))
+    if len(n):
+        hm = gaussian_blur(batch_heatmaps[n, j][:, np.newaxis], kernel)
+        hm = np.log(np.maximum(hm, 1e-10))
+        preds[n, j] = batch_taylor(hm, coords[n, j][:, np.newaxis])[:, 0]
+    return preds
+
+
+# 逐张热图原地 cv2.GaussianBlur，边界外按 0 处理，与补零后模糊相同，不再另开补零的缓冲
+# 卷积后每张热图按原最大值缩放
 def gaussian_blur(hm, kernel):
-    border = (kernel - 1) // 2
-    batch_size = hm.shape[0]
-    num_joints = hm.shape[1]
-    height = hm.shape[2]
-    width = hm.shape[3]
-    for i in range(batch_size):
-        for j in range(num_joints):
-            origin_max = np.max(hm[i, j])
-            dr = np.zeros((height + 2 * border, width + 2 * border))
-            dr[border: -border, border: -border] = hm[i, j].copy()
-            dr = cv2.GaussianBlur(dr, (kernel, kernel), 0)
-            hm[i, j] = dr[border: -border, border: -border].copy()
-            hm[i, j] *= origin_max / np.max(hm[i, j])
+    height, width = hm.shape[2:]
+    hm = np.ascontiguousarray(hm)
+    origin_max = hm.max(axis=(2, 3), keepdims=True)
+
+    for dr in hm.reshape(-1, height, width):
+        cv2.GaussianBlur(dr, (kernel, kernel), 0, dst=dr, borderType=cv2.BORDER_CONSTANT)
+
+    blurred_max = hm.max(axis=(2, 3), keepdims=True)
+    hm *= origin_max / np.where(blurred_max != 0, blurred_max, 1)
     return hm
 
 
+# --------------------张量后处理-----------------------------
+# 与上面的 numpy 实现一一对应，全部在热图所在的设备上计算，只有 (N J 2) 的坐标需要拷回
+
+
+def get_max_preds_tensor(batch_heatmaps):
+    """
+    batch_heatmaps: torch.Tensor([batch_size, num_joints, height, width])
+    """
+    width = batch_heatmaps.shape[3]
+    maxvals, idx = batch_heatmaps.flatten(2).max(dim=2, keepdim=True)
+    preds = torch.cat([idx % width, torch.div(idx, width, rounding_mode='floor')], dim=2).float()
+    preds *= (maxvals > 0).float()  # 只有最大值大于 0 才有效
+    return preds, maxvals
+
+
+def batch_taylor_tensor(batch_heatmaps, coords):
+    batch_size, num_joints, height, width = batch_heatmaps.shape
+    px = coords[..., 0].long()
+    py = coords[..., 1].long()
+    valid = (1 < px) & (px < width - 2) & (1 < py) & (py < height - 2)
+    px = px.clamp(2, width - 3)
+    py = py.clamp(2, height - 3)
+    n = torch.arange(batch_size, device=coords.device)[:, None]
+    j = torch.arange(num_joints, device=coords.device)[None, :]
+
+    def at(dy, dx):
+        return batch_heatmaps[n, j, py + dy, px + dx]
+
+    return apply_taylor_tensor(coords, at, valid)
+
+
+def apply_taylor_tensor(coords, at, valid):
+    center = at(0, 0)
+    dx = 0.5 * (at(0, 1) - at(0, -1))
+    dy = 0.5 * (at(1, 0) - at(-1, 0))
+    dxx = 0.25 * (at(0, 2) - 2 * center + at(0, -2))
+    dxy = 0.25 * (at(1, 1) - at(-1, 1) - at(1, -1) + at(-1, -1))
+    dyy = 0.25 * (at(2, 0) - 2 * center + at(-2, 0))
+    det = dxx * dyy - dxy ** 2
+    valid = valid & (det != 0)
+    det = torch.where(valid, det, torch.ones_like(det))
+    offset = torch.stack([dxy * dy - dyy * dx, dxy * dx - dxx * dy], dim=-1) / det[..., None]
+    return coords + torch.where(valid[..., None], offset, torch.zeros_like(offset)).to(coords.dtype)
+
+
+def get_patches_tensor(batch_heatmaps, coords, radius):
+    batch_size, num_joints, height, width = batch_heatmaps.shape
+    offsets = torch.arange(-radius, radius + 1, device=coords.device)
+    rows = coords[..., 1].long()[..., None] + offsets
+    cols = coords[..., 0].long()[..., None] + offsets
+    inside = ((0 <= rows) & (rows < height))[..., :, None] & ((0 <= cols) & (cols < width))[..., None, :]
+    n = torch.arange(batch_size, device=coords.device)[:, None, None, None]
+    j = torch.arange(num_joints, device=coords.device)[None, :, None, None]
+    rows = rows.clamp(0, height - 1)[..., :, None]
+    cols = cols.clamp(0, width - 1)[..., None, :]
+    patches = batch_heatmaps[n, j, rows, cols]
+    return torch.where(inside, patches, torch.zeros_like(patches))
+
+
+# 块上不填充的两次 conv2d，得到关键点周围 5×5 的模糊值
+# 与 local_taylor 相同，块上有不大于 0 的模糊值的关键点改在整张热图上计算
+def local_taylor_tensor(batch_heatmaps, coords, kernel):
+    batch_size, num_joints, height, width = batch_heatmaps.shape
+    px = coords[..., 0].long()
+    py = coords[..., 1].long()
+    valid = (1 < px) & (px < width - 2) & (1 < py) & (py < height - 2)
+
+    weights = torch.from_numpy(cv2.getGaussianKernel(kernel, 0).ravel()).to(batch_heatmaps)
+    patches = get_patches_tensor(batch_heatmaps, coords, 2 + (kernel - 1) // 2)
+    size = patches.shape[-1]
+    dr = patches.reshape(batch_size * num_joints, 1, size, size)
+    dr = F.conv2d(dr, weights.view(1, 1, 1, kernel))
+    dr = F.conv2d(dr, weights.view(1, 1, kernel, 1))
+    blurred = dr.view(batch_size, num_joints, 5, 5)
+    hm = blurred.clamp(min=1e-10).log()
+
+    def at(dy, dx):
+        return hm[..., 2 + dy, 2 + dx]
+
+    preds = apply_taylor_tensor(coords, at, valid)
+    n, j = torch.nonzero(valid & (blurred <= 0).flatten(2).any(dim=2), as_tuple=True)
+    if len(n):
+        hm = gaussian_blur_tensor(batch_heatmaps[n, j][:, None], kernel).clamp(min=1e-10).log()
+        preds[n, j] = batch_taylor_tensor(hm, coords[n, j][:, None])[:, 0]
+    return preds
+
+
+# 可分离高斯核的两次 conv2d，零填充
+# 每张热图作为一个通道分组卷积，比单通道的一大批快得多
+def gaussian_blur_tensor(hm, kernel):
+    border = (kernel - 1) // 2
+    batch_size, num_joints, height, width = hm.shape
+    maps = batch_size * num_joints
+    weights = torch.from_numpy(cv2.getGaussianKernel(kernel, 0).ravel()).to(hm)
+    origin_max = hm.amax(dim=(2, 3), keepdim=True)
+
+    dr = hm.reshape(1, maps, height, width)
+    dr = F.conv2d(dr, weights.view(1, 1, 1, kernel).expand(maps, -1, -1, -1), padding=(0, border), groups=maps)
+    dr = F.conv2d(dr, weights.view(1, 1, kernel, 1).expand(maps, -1, -1, -1), padding=(border, 0), groups=maps)
+    dr = dr.view(batch_size, num_joints, height, width)
+
+    blurred_max = dr.amax(dim=(2, 3), keepdim=True)
+    return dr * (origin_max / torch.where(blurred_max != 0, blurred_max, torch.ones_like(blurred_max)))
+
+
+# local: 只处理关键点周围的一块，见 local_taylor
+def get_final_preds_tensor(hm, kernel, local=True):
+    coords, maxvals = get_max_preds_tensor(hm)
+
+    # post-processing
+    if local:
+        return local_taylor_tensor(hm, coords, kernel), maxvals
+    hm = gaussian_blur_tensor(hm, kernel)
+    hm = hm.clamp(min=1e-10).log()
+    preds = batch_taylor_tensor(hm, coords)
+    return preds, maxvals
+
+
 def get_final_preds(config, hm):
     coords, maxvals = get_max_preds(hm)
 
@@ -97,9 +282,5 @@ def get_final_preds(config, hm):
     hm = gaussian_blur(hm, config.TEST.BLUR_KERNEL)
     hm = np.maximum(hm, 1e-10)
     hm = np.log(hm)
-    for n in range(coords.shape[0]):
-        for p in range(coords.shape[1]):
-            coords[n, p] = taylor(hm[n][p], coords[n][p])
-
-    preds = coords.copy()
+    preds = batch_taylor(hm, coords)
     return preds, maxvals
@@ -1,73 +1,49 @@
 import cv2
 import numpy as np
-from model.inference import gaussian_blur, get_max_preds, taylor
+from model.inference import batch_taylor, gaussian_blur, get_final_preds_tensor, get_max_preds, local_taylor
 from model.unet import get_pose_net
+import os
+import threading
 import torch
 
 
-def convert_img(img):
-    """
-    pytorch 的训练方式是通道优先
-    将 HWC 转为 CWH
-    """
-
-    # H  W  C ---> C  H  W ----> C W H
-    img = torch.from_numpy(img).float()
-    if len(img.shape) == 2:
-        img = img.unsqueeze(0)
-    elif len(img.shape) == 3:
-        img = img.transpose(0, 2).transpose(1, 2)
-
-    return img
-
-
-# -----------定义图片预处理--------------------------
-def load_and_convert_image(ori_img, input_imag_size=(256, 512), convert=True):
-    img = cv2.resize(ori_img, input_imag_size)
-
-    ori_img = np.array(ori_img)
-    ori_img = torch.from_numpy(ori_img).float()
-    img = np.array(img)
-    if convert:
-        img = convert_img(img)
-    img = img - img.mean()
-    img /= img.std()
-    img /= img.max()
-
-    return img.unsqueeze(dim=0), ori_img.unsqueeze(dim=0)  # chw: channel height width
+# hm 为 numpy 数组或 torch 张量，张量在其所在设备上处理，只拷回坐标和最大值
+# local: 只在每个关键点周围的一块上模糊和求导，结果与整图处理在容差内一致
+def get_pred(hm, local=True):
+    if isinstance(hm, torch.Tensor):
+        preds, maxvals = get_final_preds_tensor(hm, 11, local)
+        return preds.cpu().numpy(), maxvals.cpu().numpy()
 
-
-def get_pred(hm):
     coords, maxvals = get_max_preds(hm)
 
     # post-processing
+    if local:
+        return local_taylor(hm, coords, 11), maxvals
     hm = gaussian_blur(hm, 11)
     hm = np.maximum(hm, 1e-10)
     hm = np.log(hm)
-    for n in range(coords.shape[0]):
-        for p in range(coords.shape[1]):
-            coords[n, p] = taylor(hm[n][p], coords[n][p])
-
-    preds = coords.copy()
+    preds = batch_taylor(hm, coords)
     return preds, maxvals
 
 
-# --------------------模型预测-----------------------------
-# 使用模型对指定图片文件路径完成图像分类，返回值为预测的种类名称
-def predict_image(model, input_map, ori_img):
-    output = model(input_map)
-    out_shape = output.shape
-    pred, _ = get_pred(output.detach().numpy())
+# 热图坐标 ---> 原图坐标的缩放，(N 1 2) 或 (1 1 2)
+def get_norm(ori_size, out_shape):
+    ori_size = np.array(ori_size, dtype=np.float64).reshape(-1, 2)
+    out_h, out_w = out_shape[2:]
+    return (ori_size[:, ::-1] / [out_w, out_h]).reshape(-1, 1, 2)
 
-    ori_w = ori_img.shape[2]
-    ori_h = ori_img.shape[1]
-    out_w = out_shape[3]
-    out_h = out_shape[2]
 
-    batch_size = output.shape[0]
-    norm = np.array([ori_w / out_w, ori_h / out_h]).reshape(batch_size, 1, 2)
-    pred = pred * norm
-    return pred
+# 路径按 8 位灰度或 BGR 读入，.dcm 取第一帧按文件自带的窗位窗宽转换，与界面中一致
+def read_image(img):
+    if not isinstance(img, str):
+        return img
+    if os.path.splitext(img)[1].lower() == '.dcm':
+        from module import dicom
+        return dicom.read_model_img(img)
+    ori_img = cv2.imread(img, cv2.IMREAD_ANYCOLOR)
+    if ori_img is None:
+        raise ValueError(f'{img} is not a readable image')
+    return ori_img
 
 
 def load_model(model_path='static/model_best.pth'):
@@ -76,13 +52,84 @@ def load_model(model_path='static/model_best.pth'):
     return model
 
 
-model = load_model()
+# --------------------推理会话-----------------------------
+class InferenceSession:
+    """
+    持有 eval 模式、不记录梯度的模型，以及预先分配的 (N 3 H W) 输入张量
+    每次预测把图片缩放、各自归一化后原地写入该张量，不再分配新的输入
+    同一时间只做一次预测
+    """
 
+    def __init__(self, model_path='static/model_best.pth', input_imag_size=(256, 512), num_threads=None,
+                 batch_size=8):
+        # 默认给界面线程留一个核
+        torch.set_num_threads(num_threads or max(1, (os.cpu_count() or 2) - 1))
+        self.model = load_model(model_path).eval()
+        self.model.requires_grad_(False)
+        self.input_imag_size = input_imag_size
+        self.batch_size = batch_size
+        self.input_map = torch.empty(1, 3, input_imag_size[1], input_imag_size[0])
+        self.lock = threading.Lock()
+
+    # 前 n 张的输入，不够时重新分配
+    def get_input_map(self, n):
+        if n > self.input_map.shape[0]:
+            self.input_map = torch.empty(n, *self.input_map.shape[1:])
+        return self.input_map[:n]
+
+    # ori_img 为灰度图 (H W) 或 BGR / BGRA 图 (H W C)，写入 input_map (3 H W)
+    def load_image(self, ori_img, input_map):
+        img = cv2.resize(ori_img, self.input_imag_size)
+        img = torch.from_numpy(img)
+        # H W ---> 3 H W, H W C ---> C H W
+        img = img.expand(3, -1, -1) if len(img.shape) == 2 else img[..., :3].permute(2, 0, 1)
+        input_map.copy_(img)
+        input_map -= input_map.mean()
+        input_map /= input_map.std()
+        input_map /= input_map.max()
+
+    # 一批图片 (或图片路径)，一次前向，各自按原图大小还原，返回每张图片的 (37 2) 关键点
+    def predict_batch(self, ori_imgs):
+        ori_imgs = [read_image(ori_img) for ori_img in ori_imgs]
+        with self.lock, torch.inference_mode():
+            input_map = self.get_input_map(len(ori_imgs))
+            for ori_img, img_map in zip(ori_imgs, input_map):
+                self.load_image(ori_img, img_map)
+            output = self.model(input_map)
+            pred, _ = get_pred(output)
+        norm = get_norm([ori_img.shape[:2] for ori_img in ori_imgs], output.shape)
+        return list(pred * norm)
+
+    # 任意多张图片 (或图片路径)，每 batch_size 张一批
+    def predict_all(self, ori_imgs, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        ori_imgs = list(ori_imgs)
+        preds = []
+        for i in range(0, len(ori_imgs), batch_size):
+            preds.extend(self.predict_batch(ori_imgs[i: i + batch_size]))
+        return preds
+
+    def predict(self, ori_img):
+        return self.predict_batch([ori_img])[0]
+
+
+# 会话在第一次使用时才创建
+session = None
+session_lock = threading.Lock()
+
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            session = InferenceSession()
+    return session
 
-def auto_get_points(img):
-    input_map, ori_img = load_and_convert_image(img)
 
+def auto_get_points(img):
     # 得到关键点
-    result = predict_image(model, input_map, ori_img)
+    return get_session().predict(img)
+
 
-    return result[0]
+def auto_get_all_points(imgs, batch_size=None):
+    return get_session().predict_all(imgs, batch_size)
@@ -1,13 +1,19 @@
-from model import test
-from module import utils
+from concurrent.futures import Future
+from module import dicom, utils
+from module.cache import LRUCache
 from module.config import config
+from module.layer import Label, LabelLayer
 from module.mode import LabelMode
+from module.store import AnnotationStore
+from module.worker import auto_get_points, Frame, FramePrefetcher, load_model, read_frame, TaskRunner, window_frame
 from ui.form import Ui_form
-from PyQt5.QtCore import pyqtBoundSignal, QCoreApplication, QEvent, QObject, QPointF, QRectF, QSize, Qt
-from PyQt5.QtGui import QColor, QCursor, QFont, QIcon, QMouseEvent, QPainter, QPen, QPixmap, QResizeEvent
-from PyQt5.QtWidgets import QAction, QFileDialog, QGraphicsScene, QInputDialog, QMainWindow, QMenu, QMessageBox, \
-                            QStatusBar
-from typing import Dict, List, Optional, Set, Tuple
+import numpy
+from PyQt5.QtCore import pyqtBoundSignal, QCoreApplication, QEvent, QObject, QPoint, QPointF, QRectF, QSize, Qt
+from PyQt5.QtGui import QColor, QCursor, QFont, QFontMetricsF, QIcon, QImage, QKeySequence, QMouseEvent, QPainter, \
+                        QPen, QPixmap, QResizeEvent, QShowEvent
+from PyQt5.QtWidgets import QAction, QFileDialog, QGraphicsScene, QInputDialog, QLabel, QMainWindow, \
+                            QMenu, QMessageBox, QProgressBar, QStatusBar
+from typing import Callable, List, Optional, Set, Tuple
 
 
 class LabelApp(QMainWindow, Ui_form):
@@ -25,17 +31,52 @@ class LabelApp(QMainWindow, Ui_form):
         self.mode = LabelMode.DEFAULT_MODE
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(160)
+        self.progress_bar.hide()
+        self.status_bar.addPermanentWidget(self.progress_bar)
+        self.worklist_label = QLabel()
+        self.status_bar.addPermanentWidget(self.worklist_label)
 
         # init image size
         self.img_size = 1
 
+        # init scene
+        # image and labels live in one long-lived scene, every label is an item above the image
+        self.scene = QGraphicsScene(self)
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.img_item = self.scene.addPixmap(QPixmap())
+        self.label_layer = LabelLayer(self.scene, lambda painter, label: self.draw_label(painter, label, False))
+        self.img_view.setScene(self.scene)
+
         # init image
         self.src: Optional[QPixmap] = None
         self.img: Optional[QPixmap] = None
         self.path: Optional[str] = None
-        self.ratio_from_old = 1
         self.ratio_to_src = 1
 
+        # init scaled image cache
+        # width, height - scaled src
+        self.img_cache = LRUCache(config.img_cache_size)
+
+        # init frame
+        # DICOM only: the shown frame, its file's frames (possibly memory-mapped) and the window mapping it to src
+        self.frame: Optional[Frame] = None
+        self.window_origin: Optional[Tuple[QPoint, dicom.Window]] = None
+
+        # init frame prefetcher
+        # path, frame index, window (None: the file's own) - frame, decoded in background
+        self.prefetcher = FramePrefetcher(config.frame_cache_size, config.frame_workers, config.frame_cache_bytes)
+
+        # init task runner
+        # reading, model loading and inference run in background, their results come back in the UI thread
+        self.runner = TaskRunner(config.task_workers, self)
+        self.runner.changed.connect(self.update_task_status)
+
+        # init worklist
+        # DICOM files in the folder of the shown one, by name
+        self.worklist: List[str] = []
+
         # init pixel spacing
         self.pixel_spacing: Optional[Tuple[float, float]] = None
 
@@ -48,17 +89,12 @@ class LabelApp(QMainWindow, Ui_form):
         self.index_b: Optional[int] = None
         self.index_c: Optional[int] = None
 
-        # a: index_a - a, color
-        self.points: Dict[int, Tuple[QPointF, QColor]] = {}
-
+        # a: index_a - src point of a, color
         # ab: index_a, index_b - color
-        self.lines: Dict[Tuple[int, int], QColor] = {}
-
         # ∠abc: index_a, index_b, index_c - color
-        self.angles: Dict[Tuple[int, int, int], QColor] = {}
-
         # ⊙a, r = ab: index_a, index_b - color
-        self.circles: Dict[Tuple[int, int], QColor] = {}
+        # colors are kept as indexs into config.color_list, unknown colors are appended
+        self.store = AnnotationStore([QColor(color).name() for color in config.color_list])
 
         # init pivots
         self.pivots: Set[int] = set()
@@ -67,12 +103,20 @@ class LabelApp(QMainWindow, Ui_form):
         self.highlight_move_index: Optional[int] = None
         self.highlight_points: Set[int] = set()
 
+        # init dirty points
+        # points changed since the last label update
+        self.dirty_points: Set[int] = set()
+
         # init right button menu
         self.right_btn_menu = QMenu(self)
 
         # init image dir
         self.dir: Optional[str] = None
 
+        # init model state
+        # the model is loaded on first use, or warmed in background once the window is shown
+        self.model_requested = False
+
     def init_color_box(self):
         size = self.color_box.iconSize()
         default_index = -1
@@ -105,6 +149,8 @@ class LabelApp(QMainWindow, Ui_form):
         self.export_all_btn.triggered.connect(self.export_all)
         self.export_pivots_btn.triggered.connect(self.export_pivots)
         self.quit_app_btn.triggered.connect(QCoreApplication.instance().quit)
+        QCoreApplication.instance().aboutToQuit.connect(self.prefetcher.shutdown)
+        QCoreApplication.instance().aboutToQuit.connect(self.runner.shutdown)
         self.inc_size_btn.triggered.connect(self.inc_img_size)
         self.dec_size_btn.triggered.connect(self.dec_img_size)
         self.reset_size_btn.triggered.connect(self.reset_img_size)
@@ -113,31 +159,50 @@ class LabelApp(QMainWindow, Ui_form):
         self.action_box.currentIndexChanged.connect(self.switch_mode)
         self.img_size_slider.valueChanged.connect(self.set_img_size_slider)
         self.auto_add_pts_btn.triggered.connect(self.auto_add_points)
+        self.open_dir_btn.triggered.connect(self.open_dir)
+        self.prev_img_btn.triggered.connect(lambda: self.show_worklist_at(-1))
+        self.next_img_btn.triggered.connect(lambda: self.show_worklist_at(1))
+        self.init_frame_actions()
+
+    # PageUp / PageDown: previous / next frame
+    # shortcuts, as the image view would take the keys for scrolling otherwise
+    def init_frame_actions(self):
+        for key, step in ((Qt.Key_PageUp, -1), (Qt.Key_PageDown, 1)):
+            action = QAction(self)
+            action.setShortcut(QKeySequence(key))
+            action_triggered: pyqtBoundSignal = action.triggered
+            action_triggered.connect(lambda _, step=step: self.show_frame_at(step))
+            self.addAction(action)
 
     def reset_img(self):
         self.src = None
         self.img = None
         self.path = None
-        self.ratio_from_old = 1
         self.ratio_to_src = 1
+        self.img_cache.clear()
+        self.frame = None
+        self.window_origin = None
+        self.worklist_label.setText('')
         self.pixel_spacing = None
         self.patient_info.setMarkdown('')
+        self.img_item.setPixmap(QPixmap())
+        self.label_layer.clear()
+        self.scene.setSceneRect(QRectF())
 
     def reset_index(self):
+        self.mark_dirty(self.index_a, self.index_b, self.index_c)
         self.index_a = None
         self.index_b = None
         self.index_c = None
 
     def reset_highlight(self):
+        self.mark_dirty(self.highlight_move_index, *self.highlight_points)
         self.highlight_move_index = None
         self.highlight_points.clear()
 
     def reset_except_img(self):
         self.reset_index()
-        self.points.clear()
-        self.lines.clear()
-        self.angles.clear()
-        self.circles.clear()
+        self.store.clear()
         self.pivots.clear()
         self.reset_highlight()
 
@@ -145,191 +210,267 @@ class LabelApp(QMainWindow, Ui_form):
         self.reset_img()
         self.reset_except_img()
 
+    # tasks of the shown image, their results would land on the next one
+    def cancel_img_tasks(self):
+        self.runner.cancel('frame')
+        self.runner.cancel('header')
+        self.runner.cancel('inference')
+
     def update_img(self):
         if not self.src:
-            self.reset_img()
             return None
-        old = self.img if self.img else self.src
         size = QSize(
             (self.img_view.width() - 2 * self.img_view.lineWidth()) * self.img_size,
             (self.img_view.height() - 2 * self.img_view.lineWidth()) * self.img_size
         )
-        self.img = self.src.scaled(size, Qt.KeepAspectRatio)
-        self.ratio_from_old = self.img.width() / old.width()
-        self.ratio_to_src = self.src.width() / self.img.width()
-
-    def update_points(self):
-        if not self.img or not self.points or self.ratio_from_old == 1:
+        size = self.src.size().scaled(size, Qt.KeepAspectRatio)
+        if self.img and self.img.size() == size:
             return None
-        for point, _ in self.points.values():
-            point.setX(point.x() * self.ratio_from_old)
-            point.setY(point.y() * self.ratio_from_old)
-        self.ratio_from_old = 1
+        key = (size.width(), size.height())
+        if (img := self.img_cache.get(key)) is None:
+            img = self.src.scaled(size, Qt.KeepAspectRatio)
+            self.img_cache.put(key, img)
+        self.img = img
+        self.ratio_to_src = self.src.width() / self.img.width()
+        self.img_item.setPixmap(self.img)
+        self.scene.setSceneRect(QRectF(self.img.rect()))
 
+    # points are kept in src coordinates, the view transform only applies when drawing and hit-testing
     def get_src_point(self, point: QPointF):
         return QPointF(point.x() * self.ratio_to_src, point.y() * self.ratio_to_src)
 
     def get_img_point(self, point: QPointF):
         return QPointF(point.x() / self.ratio_to_src, point.y() / self.ratio_to_src)
 
-    def label_points(self, img: Optional[QPixmap], to_src: bool):
-        if not img or not self.points:
-            return None
-        painter = QPainter()
-        painter.begin(img)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-        pen = QPen()
+    def get_point(self, index: int):
+        return QPointF(*self.store.get_point(index))
+
+    def get_point_color(self, index: int):
+        return QColor(self.store.get_point_color(index))
+
+    def get_label_color(self, kind: str, key: Tuple[int, ...]):
+        return QColor(self.store.get_label_color(kind, key))
+
+    def get_label_point(self, index: int, to_src: bool):
+        point = self.get_point(index)
+        return point if to_src else self.get_img_point(point)
+
+    def get_label_pen(self, width: float, color: QColor, to_src: bool):
+        pen = QPen(color)
         pen.setCapStyle(Qt.RoundCap)
-        pen.setWidthF(config.point_width * (self.ratio_to_src if to_src else 1))
-        font = QFont('Consolas')
+        pen.setWidthF(width * (self.ratio_to_src if to_src else 1))
+        return pen
+
+    def get_label_font(self, to_src: bool):
+        font = QFont(config.font_family)
         font.setPointSizeF(config.font_size * (self.ratio_to_src if to_src else 1))
-        painter.setFont(font)
-        for index, (point, color) in self.points.items():
-            if to_src:
-                pen.setColor(color)
-                label_point = self.get_src_point(point)
-            else:
-                pen.setColor(
-                    color if index != self.highlight_move_index and index not in self.highlight_points
-                    else QColor.lighter(color)
-                )
-                label_point = point
+        return font
+
+    # the area covered by a label: shape from a to b, widened by the pen, plus its text
+    @staticmethod
+    def get_label_rect(a: QPointF, b: QPointF, pen: QPen, font: Optional[QFont] = None,
+                       text_point: Optional[QPointF] = None, text: Optional[str] = None):
+        width = pen.widthF()
+        rect = QRectF(a, b).normalized().adjusted(-width, -width, width, width)
+        if font and text:
+            rect = rect.united(QFontMetricsF(font).boundingRect(text).translated(text_point))
+        return rect
+
+    # painter is None: only measure the label
+    def draw_point(self, painter: Optional[QPainter], index: int, to_src: bool):
+        color = self.get_point_color(index)
+        if not to_src and (index == self.highlight_move_index or index in self.highlight_points):
+            color = QColor.lighter(color)
+        label_point = self.get_label_point(index, to_src)
+        pen = self.get_label_pen(config.point_width, color, to_src)
+        font = self.get_label_font(to_src)
+        text_point = utils.get_index_shift(label_point)
+        text = str(index)
+        if painter:
             painter.setPen(pen)
+            painter.setFont(font)
             painter.drawPoint(label_point)
-            painter.drawText(utils.get_index_shift(label_point), str(index))
-        painter.end()
-
-    def label_lines(self, img: Optional[QPixmap], to_src: bool):
-        if not img or not self.lines:
-            return None
-        painter = QPainter()
-        painter.begin(img)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-        pen = QPen()
-        pen.setCapStyle(Qt.RoundCap)
-        pen.setWidthF(config.line_width * (self.ratio_to_src if to_src else 1))
-        font = QFont('Consolas')
-        font.setPointSizeF(config.font_size * (self.ratio_to_src if to_src else 1))
-        painter.setFont(font)
-        for (index_a, index_b), color in self.lines.items():
-            is_highlight = index_a in self.highlight_points and index_b in self.highlight_points \
-                          and (self.mode == LabelMode.ANGLE_MODE or self.mode == LabelMode.VERTICAL_MODE)
-            pen.setColor(QColor.lighter(color) if is_highlight else color)
+            painter.drawText(text_point, text)
+        return self.get_label_rect(label_point, label_point, pen, font, text_point, text)
+
+    def draw_line(self, painter: Optional[QPainter], key: Tuple[int, int], to_src: bool):
+        index_a, index_b = key
+        color = self.get_label_color('line', key)
+        is_highlight = index_a in self.highlight_points and index_b in self.highlight_points \
+                      and (self.mode == LabelMode.ANGLE_MODE or self.mode == LabelMode.VERTICAL_MODE)
+        pen = self.get_label_pen(config.line_width, QColor.lighter(color) if is_highlight else color, to_src)
+        font = self.get_label_font(to_src)
+        src_a = self.get_point(index_a)
+        src_b = self.get_point(index_b)
+        label_a = self.get_label_point(index_a, to_src)
+        label_b = self.get_label_point(index_b, to_src)
+        real_a = src_a
+        real_b = src_b
+        if self.pixel_spacing:
+            real_a = QPointF(src_a.x() * self.pixel_spacing[0], src_a.y() * self.pixel_spacing[1])
+            real_b = QPointF(src_b.x() * self.pixel_spacing[0], src_b.y() * self.pixel_spacing[1])
+        text_point = utils.get_distance_shift(src_a, src_b, utils.get_midpoint(label_a, label_b))
+        text = str(round(utils.get_distance(real_a, real_b), 2)) + ('mm' if self.pixel_spacing else 'px')
+        if painter:
             painter.setPen(pen)
-            a = self.points[index_a][0]
-            b = self.points[index_b][0]
-            src_a = self.get_src_point(a)
-            src_b = self.get_src_point(b)
-            label_a = src_a if to_src else a
-            label_b = src_b if to_src else b
+            painter.setFont(font)
             painter.drawLine(label_a, label_b)
-            real_a = src_a
-            real_b = src_b
-            if self.pixel_spacing:
-                real_a = QPointF(src_a.x() * self.pixel_spacing[0], src_a.y() * self.pixel_spacing[1])
-                real_b = QPointF(src_b.x() * self.pixel_spacing[0], src_b.y() * self.pixel_spacing[1])
-            painter.drawText(
-                utils.get_distance_shift(a, b, utils.get_midpoint(label_a, label_b)),
-                str(round(utils.get_distance(real_a, real_b), 2)) + ('mm' if self.pixel_spacing else 'px')
-            )
-        painter.end()
-
-    def label_angles(self, img: Optional[QPixmap], to_src: bool):
-        if not img or not self.angles:
-            return None
-        painter = QPainter()
-        painter.begin(img)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-        pen = QPen()
-        pen.setCapStyle(Qt.RoundCap)
-        pen.setWidthF(config.angle_width * (self.ratio_to_src if to_src else 1))
-        font = QFont('Consolas')
-        font.setPointSizeF(config.font_size * (self.ratio_to_src if to_src else 1))
-        painter.setFont(font)
-        for (index_a, index_b, index_c), color in self.angles.items():
-            pen.setColor(color)
+            painter.drawText(text_point, text)
+        return self.get_label_rect(label_a, label_b, pen, font, text_point, text)
+
+    def draw_angle(self, painter: Optional[QPainter], key: Tuple[int, int, int], to_src: bool):
+        index_a, index_b, index_c = key
+        pen = self.get_label_pen(config.angle_width, self.get_label_color('angle', key), to_src)
+        font = self.get_label_font(to_src)
+        a = self.get_label_point(index_a, to_src)
+        b = self.get_label_point(index_b, to_src)
+        c = self.get_label_point(index_c, to_src)
+        d, e = utils.get_diag_points(a, b, c)
+        f = utils.get_arc_midpoint(a, b, c)
+        deg = utils.get_degree(a, b, c)
+        text_point = utils.get_degree_shift(b, f)
+        text = str(round(deg, 2)) + '°'
+        if painter:
             painter.setPen(pen)
-            a = self.points[index_a][0]
-            b = self.points[index_b][0]
-            c = self.points[index_c][0]
-            d, e = utils.get_diag_points(self.points[index_a][0], b, c)
-            f = utils.get_arc_midpoint(a, b, c)
-            label_d = self.get_src_point(d) if to_src else d
-            label_e = self.get_src_point(e) if to_src else e
-            label_rect = QRectF(label_d, label_e)
-            label_a = self.get_src_point(b) if to_src else b
-            label_b = self.get_src_point(f) if to_src else f
-            deg = utils.get_degree(a, b, c)
-            painter.drawArc(label_rect, int(utils.get_begin_degree(a, b, c) * 16), int(deg * 16))
-            painter.drawText(utils.get_degree_shift(label_a, label_b), str(round(deg, 2)) + '°')
-        painter.end()
+            painter.setFont(font)
+            painter.drawArc(QRectF(d, e), int(utils.get_begin_degree(a, b, c) * 16), int(deg * 16))
+            painter.drawText(text_point, text)
+        return self.get_label_rect(d, e, pen, font, text_point, text)
+
+    def draw_circle(self, painter: Optional[QPainter], key: Tuple[int, int], to_src: bool):
+        index_a, index_b = key
+        color = self.get_label_color('circle', key)
+        is_highlight = index_a in self.highlight_points and index_b in self.highlight_points \
+                      and self.mode == LabelMode.CIRCLE_MODE
+        pen = self.get_label_pen(config.line_width, QColor.lighter(color) if is_highlight else color, to_src)
+        rect = utils.get_min_bounding_rect(self.get_label_point(index_a, to_src), self.get_label_point(index_b, to_src))
+        if painter:
+            painter.setPen(pen)
+            painter.drawEllipse(rect)
+        return self.get_label_rect(rect.topLeft(), rect.bottomRight(), pen)
+
+    def draw_label(self, painter: Optional[QPainter], label: Label, to_src: bool):
+        kind, key = label
+        if kind == 'point':
+            return self.draw_point(painter, key, to_src)
+        if kind == 'line':
+            return self.draw_line(painter, key, to_src)
+        if kind == 'angle':
+            return self.draw_angle(painter, key, to_src)
+        return self.draw_circle(painter, key, to_src)
+
+    # in drawing order
+    def get_all_labels(self):
+        labels: List[Label] = [('point', index) for index in self.store.get_point_ids()]
+        for kind in ('line', 'angle', 'circle'):
+            labels += [(kind, key) for key in self.store.get_label_keys(kind)]
+        return labels
+
+    # labels whose look depends on one of the indexs
+    def get_labels_of(self, indexs: Set[int]):
+        labels: List[Label] = [('point', index) for index in indexs if self.store.has_point(index)]
+        for kind in ('line', 'angle', 'circle'):
+            keys = set()
+            for index in indexs:
+                keys.update(self.store.get_labels_of(kind, index))
+            labels += [(kind, key) for key in keys]
+        return labels
+
+    def draw_labels(self, painter: QPainter, labels: List[Label], to_src: bool):
+        for label in labels:
+            self.draw_label(painter, label, to_src)
 
-    def label_circles(self, img: Optional[QPixmap], to_src: bool):
-        if not img or not self.circles:
+    def update_labels(self, img: Optional[QPixmap], to_src: bool):
+        if not img:
             return None
         painter = QPainter()
         painter.begin(img)
         painter.setRenderHint(QPainter.Antialiasing, True)
-        pen = QPen()
-        pen.setCapStyle(Qt.RoundCap)
-        pen.setWidthF(config.line_width if not to_src else config.line_width * self.ratio_to_src)
-        for (index_a, index_b), color in self.circles.items():
-            is_highlight = index_a in self.highlight_points and index_b in self.highlight_points \
-                          and self.mode == LabelMode.CIRCLE_MODE
-            pen.setColor(QColor.lighter(color) if is_highlight else color)
-            painter.setPen(pen)
-            a = self.points[index_a][0]
-            b = self.points[index_b][0]
-            painter.drawEllipse(
-                utils.get_min_bounding_rect(a, b) if not to_src
-                else utils.get_min_bounding_rect(self.get_src_point(a), self.get_src_point(b))
-            )
+        self.draw_labels(painter, self.get_all_labels(), to_src)
         painter.end()
 
-    def update_labels(self, img: Optional[QPixmap], to_src: bool):
-        self.label_points(img, to_src)
-        self.label_lines(img, to_src)
-        self.label_angles(img, to_src)
-        self.label_circles(img, to_src)
+    def mark_dirty(self, *indexs: Optional[int]):
+        self.dirty_points.update(abs(index) for index in indexs if index)
+
+    # items of labels about to be erased or renamed must not paint stale keys
+    def drop_labels_of(self, index: int):
+        for label in self.get_labels_of({index}):
+            self.label_layer.remove(label)
 
     def update_img_view(self):
-        scene = QGraphicsScene()
-        if self.img:
-            scene.addPixmap(self.img)
-        self.img_view.setScene(scene)
+        self.dirty_points.clear()
+        if not self.img:
+            self.label_layer.clear()
+            return None
+        self.label_layer.reset(self.get_all_labels())
+
+    # only the items of labels depending on dirty points are moved and repainted
+    def update_dirty_labels(self):
+        if self.img and self.dirty_points:
+            self.label_layer.sync(self.get_labels_of(self.dirty_points))
+        self.dirty_points.clear()
+
+    # after an edit: only the labels of the points it touched are added, moved or repainted
+    def update_edit(self):
+        self.update_dirty_labels()
+        self.update_pivots_info()
 
     def update_pivots_info(self):
-        if not self.img or not self.points or not self.pivots:
+        if not self.img or not self.store.points or not self.pivots:
             self.pivots_info.setMarkdown('')
             return None
         pivots = list(self.pivots)
         pivots.sort()
         md_info = ''
         for index in pivots:
-            point = self.get_src_point(self.points[index][0])
+            point = self.get_point(index)
             md_info += f'{index}: ({round(point.x(), 2)}, {round(point.y(), 2)})\n\n'
         self.pivots_info.setMarkdown(md_info)
 
     def update_all(self):
         self.update_img()
-        self.update_points()
-        self.update_labels(self.img, False)
         self.update_img_view()
         self.update_pivots_info()
 
     def resizeEvent(self, _: QResizeEvent):
         self.update_all()
 
+    def showEvent(self, _: QShowEvent):
+        if config.preload_model and not self.model_requested:
+            self.start_model_loading()
+
+    def start_model_loading(self):
+        self.model_requested = True
+        self.runner.submit(
+            'model', '正在加载模型…', lambda _: self.status_bar.showMessage('模型加载完成', 1000),
+            lambda error: self.status_bar.showMessage(f'模型加载失败：{error}', 3000), load_model
+        )
+
+    # a busy bar and the message of the latest task while any is running
+    def update_task_status(self):
+        if message := self.runner.get_message():
+            self.progress_bar.setRange(0, 0)
+            self.progress_bar.show()
+            self.status_bar.showMessage(message)
+        else:
+            self.progress_bar.hide()
+            self.status_bar.clearMessage()
+
     def get_point_index(self, point: QPointF):
-        if not self.img or not self.points:
-            return None
-        distance = config.point_width - config.eps
-        index = None
-        for idx, (pt, _) in self.points.items():
-            if (dis := utils.get_distance(point, pt)) < distance:
-                distance = dis
-                index = idx
-        return index
+        if not self.img or not self.store.points:
+            return None
+        src_point = self.get_src_point(point)
+        return self.store.get_nearest_point(
+            src_point.x(), src_point.y(), (config.point_width - config.eps) * self.ratio_to_src
+        )
+
+    # point: src point
+    def set_point(self, index: int, point: QPointF, color: QColor):
+        self.store.set_point(index, point.x(), point.y(), color.name())
+        self.mark_dirty(index)
+
+    def move_point(self, index: int, point: QPointF):
+        self.store.move_point(index, point.x(), point.y())
 
     def is_point_out_of_bound(self, point: QPointF):
         return point.x() < config.point_width / 2 or point.x() > self.img.width() - config.point_width / 2 \
@@ -339,8 +480,9 @@ class LabelApp(QMainWindow, Ui_form):
         return len([i for i in (self.index_a, self.index_b, self.index_c) if i])
 
     def trigger_index(self, index: int):
-        if not self.img or not self.points or not index:
+        if not self.img or not self.store.points or not index:
             return None
+        self.mark_dirty(index)
         if index in (self.index_a, self.index_b, self.index_c):
             indexs = [i for i in (self.index_a, self.index_b, self.index_c) if i != index]
             self.index_a = indexs[0]
@@ -364,42 +506,41 @@ class LabelApp(QMainWindow, Ui_form):
     def end_trigger_with(self, index: int):
         self.end_trigger()
         self.highlight_move_index = index
+        self.mark_dirty(index)
 
     def get_new_index(self):
-        return max(self.points.keys() if self.points else [0]) + 1
+        return self.store.get_new_index()
 
+    # point: src point
     def add_new_point(self, point: QPointF):
         if self.img:
             index = self.get_new_index()
-            self.points[index] = point, self.color
+            self.set_point(index, point, self.color)
             return index
 
+    def has_line(self, index_a: int, index_b: int):
+        return self.store.has_label('line', utils.get_line_key(index_a, index_b))
+
     def add_line(self, index_a: int, index_b: int):
-        if self.img and index_a in self.points and index_b in self.points:
-            self.lines[utils.get_line_key(index_a, index_b)] = self.color
+        if self.img and self.store.has_point(index_a) and self.store.has_point(index_b):
+            self.store.set_label('line', utils.get_line_key(index_a, index_b), self.color.name())
+            self.mark_dirty(index_a, index_b)
 
     def add_angle(self, index_a: int, index_b: int, index_c: int):
-        if self.img and utils.get_line_key(index_a, index_b) in self.lines \
-                and utils.get_line_key(index_b, index_c) in self.lines:
-            self.angles[utils.get_angle_key(index_a, index_b, index_c)] = self.color
+        if self.img and self.has_line(index_a, index_b) and self.has_line(index_b, index_c):
+            self.store.set_label('angle', utils.get_angle_key(index_a, index_b, index_c), self.color.name())
+            self.mark_dirty(index_a, index_b, index_c)
 
     def add_circle(self, index_a: int, index_b: int):
-        if self.img and index_a in self.points and index_b in self.points:
-            self.circles[(index_a, index_b)] = self.color
+        if self.img and self.store.has_point(index_a) and self.store.has_point(index_b):
+            self.store.set_label('circle', (index_a, index_b), self.color.name())
+            self.mark_dirty(index_a, index_b)
 
     def erase_point(self, index: int):
-        if index not in self.points:
-            return None
-        self.points.pop(index)
-        for line in list(self.lines.keys()):
-            if index in line:
-                self.lines.pop(line)
-        for angle in list(self.angles.keys()):
-            if index in angle:
-                self.angles.pop(angle)
-        for circle in list(self.circles.keys()):
-            if index in circle:
-                self.circles.pop(circle)
+        if not self.store.has_point(index):
+            return None
+        self.drop_labels_of(index)
+        self.store.remove_point(index)
         self.pivots.discard(index)
 
     def erase_highlight(self):
@@ -408,52 +549,54 @@ class LabelApp(QMainWindow, Ui_form):
                 self.erase_point(-index)
         self.reset_index()
         self.reset_highlight()
-        self.update_all()
+        self.update_edit()
 
     def handle_point_mode(self, evt: QMouseEvent):
         if evt.type() != QMouseEvent.MouseButtonPress or evt.button() != Qt.LeftButton:
             return None
         point = self.img_view.mapToScene(evt.pos())
         if index := self.get_point_index(point):
-            self.points[index] = self.points[index][0], self.color
+            self.store.set_point_color(index, self.color.name())
+            self.mark_dirty(index)
         else:
-            self.add_new_point(point)
-        self.update_all()
+            self.add_new_point(self.get_src_point(point))
+        self.update_edit()
 
     def handle_line_mode(self, evt: QMouseEvent):
         if evt.type() != QMouseEvent.MouseButtonPress or evt.button() != Qt.LeftButton:
             return None
         point = self.img_view.mapToScene(evt.pos())
         index = self.get_point_index(point)
-        self.trigger_index(index if index else -self.add_new_point(point))
+        self.trigger_index(index if index else -self.add_new_point(self.get_src_point(point)))
         if self.get_index_cnt() == 2:
             index_a = abs(self.index_a)
             index_b = abs(self.index_b)
             self.add_line(index_a, index_b)
             self.end_trigger_with(index_b)
-        self.update_all()
+        self.update_edit()
 
     def handle_angle_mode(self, evt: QMouseEvent):
         if evt.type() != QMouseEvent.MouseButtonPress or evt.button() != Qt.LeftButton:
             return None
         self.trigger_index(self.get_point_index(self.img_view.mapToScene(evt.pos())))
-        if self.get_index_cnt() == 2 and utils.get_line_key(self.index_a, self.index_b) not in self.lines:
+        if self.get_index_cnt() == 2 and not self.has_line(self.index_a, self.index_b):
             self.trigger_index(self.index_a)
         elif self.get_index_cnt() == 3:
-            if utils.get_line_key(self.index_b, self.index_c) in self.lines:
+            if self.has_line(self.index_b, self.index_c):
                 self.add_angle(self.index_a, self.index_b, self.index_c)
                 self.end_trigger_with(self.index_c)
             else:
                 index_c = self.index_c
                 self.end_trigger()
                 self.trigger_index(index_c)
-        self.update_all()
+        self.update_edit()
 
     def handle_circle_mode(self, evt: QMouseEvent):
         point = self.img_view.mapToScene(evt.pos())
         if evt.type() == QMouseEvent.MouseButtonPress and evt.button() == Qt.LeftButton:
             if self.get_index_cnt() == 0:
                 index = self.get_point_index(point)
+                point = self.get_src_point(point)
                 self.trigger_index(index if index else -self.add_new_point(point))
                 self.trigger_index(
                     -self.add_new_point(QPointF(point.x() + 2 * config.eps, point.y() + 2 * config.eps))
@@ -461,40 +604,41 @@ class LabelApp(QMainWindow, Ui_form):
                 self.add_circle(abs(self.index_a), abs(self.index_b))
             elif self.get_index_cnt() == 2:
                 self.end_trigger_with(abs(self.index_b))
+            self.update_edit()
         elif evt.type() == QMouseEvent.MouseMove and self.get_index_cnt() == 2 \
                 and not self.is_point_out_of_bound(point):
             index_b = abs(self.index_b)
-            self.points[index_b][0].setX(point.x())
-            self.points[index_b][0].setY(point.y())
-        self.update_all()
+            self.move_point(index_b, self.get_src_point(point))
+            self.mark_dirty(index_b)
+            self.update_dirty_labels()
 
     def handle_midpoint_mode(self, evt: QMouseEvent):
         if evt.type() != QMouseEvent.MouseButtonPress or evt.button() != Qt.LeftButton:
             return None
         self.trigger_index(self.get_point_index(self.img_view.mapToScene(evt.pos())))
         if self.get_index_cnt() == 2:
-            if utils.get_line_key(self.index_a, self.index_b) in self.lines:
-                a = self.points[self.index_a][0]
-                b = self.points[self.index_b][0]
+            if self.has_line(self.index_a, self.index_b):
+                a = self.get_point(self.index_a)
+                b = self.get_point(self.index_b)
                 self.add_new_point(utils.get_midpoint(a, b))
                 self.end_trigger_with(self.index_b)
             else:
                 self.trigger_index(self.index_a)
-        self.update_all()
+        self.update_edit()
 
     def handle_vertical_mode(self, evt: QMouseEvent):
         if evt.type() != QMouseEvent.MouseButtonPress or evt.button() != Qt.LeftButton:
             return None
         self.trigger_index(self.get_point_index(self.img_view.mapToScene(evt.pos())))
         if self.get_index_cnt() == 2:
-            if utils.get_line_key(self.index_a, self.index_b) not in self.lines:
+            if not self.has_line(self.index_a, self.index_b):
                 self.trigger_index(self.index_a)
         elif self.get_index_cnt() == 3:
-            a = self.points[self.index_a][0]
-            b = self.points[self.index_b][0]
-            c = self.points[self.index_c][0]
+            a = self.get_point(self.index_a)
+            b = self.get_point(self.index_b)
+            c = self.get_point(self.index_c)
             if utils.is_on_a_line(a, b, c):
-                if utils.get_line_key(self.index_b, self.index_c) in self.lines:
+                if self.has_line(self.index_b, self.index_c):
                     self.trigger_index(self.index_a)
                 else:
                     index_c = self.index_c
@@ -510,32 +654,38 @@ class LabelApp(QMainWindow, Ui_form):
                     )
                 self.add_line(self.index_c, index_d)
                 self.end_trigger_with(self.index_c)
-            self.update_all()
+            self.update_edit()
 
     def handle_drag_mode(self, evt: QMouseEvent):
         point = self.img_view.mapToScene(evt.pos())
         if evt.type() == QMouseEvent.MouseButtonPress and evt.button() == Qt.LeftButton and self.get_index_cnt() == 0:
             self.trigger_index(self.get_point_index(point))
+            self.mark_dirty(self.index_a)
         elif evt.type() == QMouseEvent.MouseMove and self.get_index_cnt() == 1 \
                 and not self.is_point_out_of_bound(point):
-            self.points[self.index_a][0].setX(point.x())
-            self.points[self.index_a][0].setY(point.y())
+            self.move_point(self.index_a, self.get_src_point(point))
+            self.mark_dirty(self.index_a)
+            self.update_pivots_info()
         elif evt.type() == QMouseEvent.MouseButtonRelease and self.get_index_cnt() == 1:
+            self.mark_dirty(self.index_a)
             self.trigger_index(self.index_a)
-        self.update_all()
+        self.update_dirty_labels()
 
     def handle_erase_point_mode(self, evt: QMouseEvent):
         if evt.type() == QMouseEvent.MouseButtonPress and evt.button() == Qt.LeftButton:
             self.erase_point(self.get_point_index(self.img_view.mapToScene(evt.pos())))
-        self.update_all()
+            self.update_edit()
 
     def handle_highlight_move(self, evt: QMouseEvent):
         point = self.img_view.mapToScene(evt.pos())
-        self.highlight_move_index = self.get_point_index(point)
+        index = self.get_point_index(point)
+        if index != self.highlight_move_index:
+            self.mark_dirty(self.highlight_move_index, index)
+            self.highlight_move_index = index
         point = self.get_src_point(point)
         text = f'坐标：{round(point.x(), 2)}, {round(point.y(), 2)}'
         self.status_bar.showMessage(text, 1000)
-        self.update_all()
+        self.update_dirty_labels()
 
     def modify_index(self, index: int):
         new_index, modify = QInputDialog.getInt(self, '更改标号', '请输入一个新的标号', index, 0, step=1)
@@ -544,35 +694,18 @@ class LabelApp(QMainWindow, Ui_form):
         if new_index <= 0:
             self.warning('标号必须为正整数！')
             return None
-        if new_index in self.points:
+        if self.store.has_point(new_index):
             self.warning('此标号已存在！')
             return None
-        self.points[new_index] = self.points[index]
-        self.points.pop(index)
-        for line in list(self.lines.keys()):
-            if index in line:
-                fixed_index = line[0] + line[1] - index
-                self.lines[utils.get_line_key(new_index, fixed_index)] = self.lines[line]
-                self.lines.pop(line)
-        for angle in list(self.angles.keys()):
-            if index in angle:
-                if index == angle[1]:
-                    self.angles[angle[0], new_index, angle[2]] = self.angles[angle]
-                else:
-                    fixed_index = angle[0] + angle[2] - index
-                    self.angles[utils.get_angle_key(new_index, angle[1], fixed_index)] = self.angles[angle]
-                self.angles.pop(angle)
-        for circle in list(self.circles.keys()):
-            if index in circle:
-                key = (new_index, circle[1]) if index == circle[0] else (circle[0], new_index)
-                self.circles[key] = self.circles[circle]
-                self.circles.pop(circle)
+        self.drop_labels_of(index)
+        self.store.rename_point(index, new_index)
+        self.mark_dirty(new_index)
         if index in self.pivots:
             self.pivots.remove(index)
             self.pivots.add(new_index)
 
     def add_pivots(self, index: int):
-        if self.img and index in self.points:
+        if self.img and self.store.has_point(index):
             self.pivots.add(index)
 
     def remove_pivots(self, index: int):
@@ -602,16 +735,52 @@ class LabelApp(QMainWindow, Ui_form):
         if index := self.get_point_index(self.img_view.mapToScene(evt.pos())):
             self.erase_highlight()
             self.highlight_move_index = index
-            self.update_all()
+            self.mark_dirty(index)
+            self.update_edit()
             self.create_right_btn_menu(index, evt.globalPos())
+            self.mark_dirty(self.highlight_move_index)
             self.highlight_move_index = self.get_point_index(
                 self.img_view.mapToScene(self.img_view.mapFromParent(self.mapFromParent(QCursor.pos())))
             )
-            self.update_all()
+            self.mark_dirty(self.highlight_move_index)
+            self.update_edit()
+
+    def set_frame(self, frame: Frame):
+        self.frame = frame
+        self.src = QPixmap.fromImage(frame.img)
+        self.img = None
+        self.img_cache.clear()
+
+    def set_window(self, window: dicom.Window):
+        self.set_frame(window_frame(self.frame, self.frame.index, window))
+        self.update_all()
+        self.status_bar.showMessage(f'窗位：{round(window.center, 2)}，窗宽：{round(window.width, 2)}', 1000)
+
+    # drag with the middle button: right / left widens / narrows the window, down / up raises / lowers the level
+    def handle_window_drag(self, evt: QMouseEvent):
+        if not self.frame:
+            return False
+        if evt.type() == QMouseEvent.MouseButtonPress and evt.button() == Qt.MiddleButton:
+            self.window_origin = evt.pos(), self.frame.window
+        elif evt.type() == QMouseEvent.MouseMove and self.window_origin and evt.buttons() & Qt.MiddleButton:
+            pos, window = self.window_origin
+            step = window.width / config.window_drag_base
+            self.set_window(window._replace(
+                center=window.center + (evt.y() - pos.y()) * step,
+                width=max(1.0, window.width + (evt.x() - pos.x()) * step)
+            ))
+        elif evt.type() == QMouseEvent.MouseButtonRelease and evt.button() == Qt.MiddleButton:
+            self.window_origin = None
+            self.prefetch_frames()
+        else:
+            return False
+        return True
 
     def eventFilter(self, obj: QObject, evt: QEvent):
         if not self.img or obj is not self.img_view.viewport() or evt.type() not in self.target_event_type:
             return super().eventFilter(obj, evt)
+        if self.handle_window_drag(evt):
+            return super().eventFilter(obj, evt)
         if self.mode == LabelMode.POINT_MODE:
             self.handle_point_mode(evt)
         elif self.mode == LabelMode.LINE_MODE:
@@ -637,13 +806,86 @@ class LabelApp(QMainWindow, Ui_form):
     def warning(self, text: str):
         QMessageBox.warning(self, '警告', text)
 
+    # frames of the shown file keep its window, other files open with their own
+    def get_frame(self, path: str, index: int = 0, window: Optional[dicom.Window] = None):
+        if self.frame and path == self.frame.path and window:
+            return self.prefetcher.submit((path, index, window), window_frame, self.frame, index, window)
+        return self.prefetcher.submit((path, index, window), read_frame, path, index, window)
+
+    # a prefetched frame is shown at once, otherwise when read, the UI stays responsive meanwhile
+    def load_frame(self, future: Future, on_result: Callable[[Frame], None]):
+        on_error: Callable[[BaseException], None] = lambda error: self.warning(f'Dicom 文件读取失败：{error}')
+        self.runner.watch('frame', '正在读取…', future, on_result, on_error)
+
+    # another image: labels are cleared
+    def show_new_frame(self, frame: Frame):
+        self.cancel_img_tasks()
+        self.reset_all()
+        self.show_frame(frame)
+
+    def show_frame(self, frame: Frame):
+        self.set_frame(frame)
+        self.patient_info.setMarkdown(frame.info)
+        self.pixel_spacing = frame.spacing
+        self.path = utils.rename_path_ext(frame.path, '.jpg')
+        self.update_all()
+        if len(frame.frames) > 1:
+            self.status_bar.showMessage(f'第 {frame.index + 1} / {len(frame.frames)} 帧', 1000)
+        self.update_worklist_info()
+        self.prefetch_frames()
+
+    # neighbouring frames with the current window, then the next files of the worklist (and the previous one)
+    # with their own
+    def prefetch_frames(self):
+        if not self.frame:
+            return None
+        path, index, window = self.frame.path, self.frame.index, self.frame.window
+        for step in range(1, config.prefetch_frames + 1):
+            for i in (index + step, index - step):
+                if 0 <= i < len(self.frame.frames):
+                    self.prefetcher.submit((path, i, window), window_frame, self.frame, i, window)
+        if path in self.worklist:
+            position = self.worklist.index(path)
+            for i in (*range(position + 1, position + config.prefetch_files + 1), position - 1):
+                if 0 <= i < len(self.worklist):
+                    self.prefetcher.submit((self.worklist[i], 0, None), read_frame, self.worklist[i])
+
+    def update_worklist_info(self):
+        if self.frame and self.frame.path in self.worklist:
+            self.worklist_label.setText(f'{self.worklist.index(self.frame.path) + 1} / {len(self.worklist)}')
+        else:
+            self.worklist_label.setText('')
+
+    # labels are kept, the frames of a file share its size
+    def show_frame_at(self, step: int):
+        if not self.frame or not 0 <= self.frame.index + step < len(self.frame.frames):
+            return None
+        self.load_frame(self.get_frame(self.frame.path, self.frame.index + step, self.frame.window), self.show_frame)
+
+    # as opening the file: labels are cleared
+    def show_worklist_at(self, step: int):
+        if not self.frame or self.frame.path not in self.worklist:
+            self.warning('请先打开一个文件夹！')
+            return None
+        index = self.worklist.index(self.frame.path) + step
+        if 0 <= index < len(self.worklist):
+            self.load_dcm_img(self.worklist[index])
+        else:
+            self.status_bar.showMessage('已是第一张' if step < 0 else '已是最后一张', 1000)
+
     # DICOM (*.dcm)
     def load_dcm_img(self, path: str):
         if utils.is_file_readable(path):
-            self.src, md_info, self.pixel_spacing = utils.get_dcm_img_with_info(path)
-            self.path = utils.rename_path_ext(path, '.jpg')
-            self.patient_info.setMarkdown(md_info)
-            self.update_all()
+            path = utils.get_abs_path(path)
+            if path not in self.worklist:
+                self.worklist = utils.get_dcm_paths(utils.get_parent_dir(path))
+            future = self.get_frame(path)
+            # the header is much quicker to read than the frame, its patient info is shown meanwhile
+            if not future.done():
+                self.runner.submit(
+                    'header', '正在读取…', self.patient_info.setMarkdown, None, utils.get_dcm_header_info, path
+                )
+            self.load_frame(future, self.show_new_frame)
         else:
             self.warning('Dicom 文件不存在或不可读！')
 
@@ -665,14 +907,32 @@ class LabelApp(QMainWindow, Ui_form):
         path, img_ext = QFileDialog.getOpenFileName(self, caption, init_dir, ext_filter, dcm_filter)
         if not path:
             return None
+        self.cancel_img_tasks()
         self.reset_all()
         self.load_dcm_img(path) if img_ext == dcm_filter else self.load_img(path)
         self.dir = utils.get_parent_dir(path)
 
+    # worklist of every DICOM file in the folder, starting from the first
+    def open_dir(self):
+        caption = '打开文件夹'
+        init_dir = self.dir if self.dir else utils.get_home_img_dir()
+        dir = QFileDialog.getExistingDirectory(self, caption, init_dir)
+        if not dir:
+            return None
+        if not (paths := utils.get_dcm_paths(dir)):
+            self.warning('文件夹中没有 Dicom 文件！')
+            return None
+        self.cancel_img_tasks()
+        self.reset_all()
+        self.worklist = paths
+        self.load_dcm_img(paths[0])
+        self.dir = dir
+
     def delete_img(self):
         if not self.src:
             self.warning('请先新建一个项目！')
             return None
+        self.cancel_img_tasks()
         self.reset_all()
         self.update_all()
 
@@ -707,21 +967,21 @@ class LabelApp(QMainWindow, Ui_form):
             if len(data) == 1:
                 pivots: List[Tuple[int, float, float]] = data['pivots']
                 for index, x, y in pivots:
-                    self.points[index] = self.get_img_point(QPointF(x, y)), self.color
+                    self.set_point(index, QPointF(x, y), self.color)
                     self.pivots.add(index)
             else:
                 points: List[Tuple[int, float, float, str]] = data['points']
                 for index, x, y, color in points:
-                    self.points[index] = self.get_img_point(QPointF(x, y)), QColor(color)
+                    self.set_point(index, QPointF(x, y), QColor(color))
                 lines: List[Tuple[int, int, str]] = data['lines']
                 for index_a, index_b, color in lines:
-                    self.lines[utils.get_line_key(index_a, index_b)] = QColor(color)
+                    self.store.set_label('line', utils.get_line_key(index_a, index_b), QColor(color).name())
                 angles: List[Tuple[int, int, int, str]] = data['angles']
                 for index_a, index_b, index_c, color in angles:
-                    self.angles[utils.get_angle_key(index_a, index_b, index_c)] = QColor(color)
+                    self.store.set_label('angle', utils.get_angle_key(index_a, index_b, index_c), QColor(color).name())
                 circles: List[Tuple[int, int, str]] = data['circles']
                 for index_a, index_b, color in circles:
-                    self.circles[(index_a, index_b)] = QColor(color)
+                    self.store.set_label('circle', (index_a, index_b), QColor(color).name())
                 self.pivots = set(data['pivots'])
             self.update_all()
 
@@ -740,18 +1000,18 @@ class LabelApp(QMainWindow, Ui_form):
             return None
         data = dict(points=[], lines=[], angles=[], circles=[], pivots=[])
         points: List[Tuple[int, float, float, str]] = data['points']
-        for index, point in self.points.items():
-            src_point = self.get_src_point(point[0])
-            points.append((index, src_point.x(), src_point.y(), point[1].name()))
+        for index in self.store.get_point_ids():
+            x, y = self.store.get_point(index)
+            points.append((index, x, y, self.store.get_point_color(index)))
         lines: List[Tuple[int, int, str]] = data['lines']
-        for index, color in self.lines.items():
-            lines.append((index[0], index[1], color.name()))
+        for index in self.store.get_label_keys('line'):
+            lines.append((index[0], index[1], self.store.get_label_color('line', index)))
         angles: List[Tuple[int, int, int, str]] = data['angles']
-        for index, color in self.angles.items():
-            angles.append((index[0], index[1], index[2], color.name()))
+        for index in self.store.get_label_keys('angle'):
+            angles.append((index[0], index[1], index[2], self.store.get_label_color('angle', index)))
         circles: List[Tuple[int, int, str]] = data['circles']
-        for index, color in self.circles.items():
-            circles.append((index[0], index[1], color.name()))
+        for index in self.store.get_label_keys('circle'):
+            circles.append((index[0], index[1], self.store.get_label_color('circle', index)))
         data['pivots'] = list(self.pivots)
         utils.save_json_file(data, path)
 
@@ -771,7 +1031,7 @@ class LabelApp(QMainWindow, Ui_form):
         data = dict(pivots=[])
         pivots: List[Tuple[int, float, float]] = data['pivots']
         for index in self.pivots:
-            point = self.get_src_point(self.points[index][0])
+            point = self.get_point(index)
             pivots.append((index, point.x(), point.y()))
         utils.save_json_file(data, json_path)
 
@@ -817,7 +1077,7 @@ class LabelApp(QMainWindow, Ui_form):
 
     def add_real_point(self, index, x: float, y: float):
         if self.img:
-            self.points[index] = self.get_img_point(QPointF(x, y)), self.color
+            self.set_point(index, QPointF(x, y), self.color)
 
     def add_new_real_point(self, x: float, y: float):
         index = self.get_new_index()
@@ -837,9 +1097,20 @@ class LabelApp(QMainWindow, Ui_form):
         if not self.src:
             self.warning('请先新建一个项目！')
             return None
-        cv2_img = utils.get_cv2_img(self.src)
-        points = test.auto_get_points(cv2_img)
+        if self.runner.is_running('inference'):
+            return None
+        # DICOM: the 8 bit pixels src was made from (RGB frames as BGR), otherwise a view of src, alive while img is
+        img = None if self.frame else self.src.toImage().convertToFormat(QImage.Format_RGB32)
+        cv2_img = dicom.to_model_img(self.frame.mat) if self.frame else utils.get_cv2_img(img)
+        self.model_requested = True
+        self.runner.submit(
+            'inference', '正在自动判断…', self.add_auto_points,
+            lambda error: self.warning(f'自动判断失败：{error}'), auto_get_points, cv2_img, img
+        )
+
+    # the task is cancelled if the image changes before it is done
+    def add_auto_points(self, points: numpy.ndarray):
         for point in points:
             index = self.add_new_real_point(point[0], point[1])
             self.add_pivots(index)
-        self.update_all()
+        self.update_edit()
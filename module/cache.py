@@ -0,0 +1,33 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+# least recently used entries are dropped first once capacity is exceeded
+class LRUCache:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.data: OrderedDict = OrderedDict()
+
+    def __contains__(self, key: Hashable):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key: Hashable, default: Optional[Any] = None):
+        if key not in self.data:
+            return default
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def put(self, key: Hashable, value: Any):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.capacity:
+            self.data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None):
+        return self.data.pop(key, default)
+
+    def clear(self):
+        self.data.clear()
@@ -56,6 +56,47 @@ class Config:
         # for ∠abc, the radius of the degree is r = min(ab, ac) * ratio_to_radius
         self.ratio_to_radius = 0.2
 
+        # cache
+        # scaled copies of the current image, keyed by size
+        self.img_cache_size = 8
+
+        # VOI LUTs of recent windows, keyed by dtype and window
+        self.lut_cache_size = 32
+
+        # dicom
+        # elements larger than this many bytes are read lazily, on first access
+        self.dcm_defer_size = '64 KB'
+
+        # map uncompressed PixelData from the file instead of decoding it into memory
+        self.dcm_memmap = True
+
+        # frame
+        # windowed frames kept ahead of time, and the number of them decoded in background
+        self.frame_cache_size = 12
+        self.frame_workers = 2
+        # bytes of pixels those frames may hold, a study that does not fit is decoded again when shown
+        self.frame_cache_bytes = 512 * 1024 * 1024
+        # frames prefetched on each side of the shown one
+        self.prefetch_frames = 2
+        # files of the worklist prefetched after the shown one
+        self.prefetch_files = 4
+
+        # task
+        # threads running reading, model loading and inference
+        self.task_workers = 2
+
+        # window
+        # dragging this many pixels changes the window by its own width
+        self.window_drag_base = 512
+
+        # grid
+        # cell size of the point index, in source image pixels
+        self.grid_cell_size = 64
+
+        # model
+        # load the keypoint model in background right after the window is shown
+        self.preload_model = True
+
         # math constant
         self.eps = 1e-5
         self.base = 2 ** 7
@@ -0,0 +1,148 @@
+from collections.abc import Sequence
+import functools
+from module.config import config
+import numpy
+from typing import NamedTuple, Optional
+
+
+# implicit / explicit VR little endian, explicit VR big endian: PixelData is stored as is
+native_syntaxes = ('1.2.840.10008.1.2', '1.2.840.10008.1.2.1', '1.2.840.10008.1.2.2')
+
+# rows converted per numpy.take call, bounds the intp copy take makes of its indexs
+chunk_rows = 256
+
+
+# VOI LUT parameters, stored value -> rescaled value -> 8 bit
+class Window(NamedTuple):
+    center: float
+    width: float
+    slope: float = 1.0
+    intercept: float = 0.0
+    # MONOCHROME1: the lowest value is white
+    inverted: bool = False
+
+
+# elements larger than config.dcm_defer_size (PixelData) are only read from the file when first accessed
+def read(path: str, **kwargs):
+    from pydicom import dcmread
+    kwargs.setdefault('defer_size', config.dcm_defer_size)
+    return dcmread(path, **kwargs)
+
+
+# everything before PixelData, enough for patient info
+def read_header(path: str):
+    from pydicom import dcmread
+    return dcmread(path, stop_before_pixels=True)
+
+
+def get_int(dcm, name: str, default: int):
+    value = getattr(dcm, name, None)
+    return int(value) if value not in (None, '') else default
+
+
+# PixelData as read from the file, a deferred value is not loaded (get_item and [] would read it)
+def get_pixel_elem(dcm):
+    return dcm._dict.get(0x7FE00010)
+
+
+# dtype, offset and length of native (uncompressed) single sample PixelData in the file, None if it can not be mapped
+def get_pixel_layout(dcm):
+    syntax = str(getattr(getattr(dcm, 'file_meta', None), 'TransferSyntaxUID', ''))
+    elem = get_pixel_elem(dcm) if syntax in native_syntaxes else None
+    if elem is None or getattr(elem, 'value_tell', None) is None or elem.length in (None, 0, 0xFFFFFFFF):
+        return None
+    bits = get_int(dcm, 'BitsAllocated', 0)
+    signed = get_int(dcm, 'PixelRepresentation', 0) == 1
+    # signed values stored in fewer bits need sign extension, left to pydicom
+    if bits not in (8, 16, 32) or get_int(dcm, 'SamplesPerPixel', 1) != 1 or \
+            signed and get_int(dcm, 'BitsStored', bits) != bits:
+        return None
+    dtype = numpy.dtype(f'{"<" if elem.is_little_endian else ">"}{"i" if signed else "u"}{bits // 8}')
+    return dtype, elem.value_tell, elem.length
+
+
+# frames, rows, columns[, samples]: a read-only memmap of PixelData when possible, so only the rows read are paged in
+def get_frames(dcm, path: str):
+    shape = get_int(dcm, 'NumberOfFrames', 1), get_int(dcm, 'Rows', 0), get_int(dcm, 'Columns', 0)
+    layout = get_pixel_layout(dcm) if config.dcm_memmap else None
+    if layout and layout[0].itemsize * shape[0] * shape[1] * shape[2] <= layout[2]:
+        return numpy.memmap(path, layout[0], 'r', layout[1], shape)
+    # pixel_array has a frame axis only for more than one frame, RGB adds a sample axis
+    pixels = dcm.pixel_array
+    return pixels if shape[0] > 1 else pixels[numpy.newaxis]
+
+
+def get_float(dcm, name: str, default: Optional[float] = None):
+    value = getattr(dcm, name, None)
+    # multi-valued window tags: the first one is the default window
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        value = value[0] if len(value) else None
+    return float(value) if value not in (None, '') else default
+
+
+# window from WindowCenter/WindowWidth, or the full range of the rescaled pixels if the file has none
+def get_window(dcm, pixels: numpy.ndarray):
+    slope = get_float(dcm, 'RescaleSlope', 1.0)
+    intercept = get_float(dcm, 'RescaleIntercept', 0.0)
+    inverted = str(getattr(dcm, 'PhotometricInterpretation', '')).strip() == 'MONOCHROME1'
+    center = get_float(dcm, 'WindowCenter')
+    width = get_float(dcm, 'WindowWidth')
+    # colour: VOI does not apply, stored values are shown as they are
+    if get_int(dcm, 'SamplesPerPixel', 1) > 1:
+        upp = 2 ** get_int(dcm, 'BitsStored', pixels.dtype.itemsize * 8) - 1
+        return Window((upp + 1) / 2, upp + 1)
+    if center is None or width is None or width < 1:
+        low = float(pixels.min()) * slope + intercept
+        upp = float(pixels.max()) * slope + intercept
+        low, upp = min(low, upp), max(low, upp)
+        center = (low + upp) / 2
+        width = upp - low + 1
+    return Window(center, width, slope, intercept, inverted)
+
+
+# DICOM PS3.3 C.11.2.1.2.1 linear window, values are stored values
+def get_windowed(values: numpy.ndarray, window: Window):
+    values = values * window.slope + window.intercept
+    mat = numpy.clip((values - (window.center - 0.5)) / max(window.width - 1, 1) + 0.5, 0, 1)
+    if window.inverted:
+        mat = 1 - mat
+    return numpy.rint(mat * 255).astype(numpy.uint8)
+
+
+# stored value (by bit pattern) - 8 bit value, for 8 and 16 bit integer data
+@functools.lru_cache(maxsize=config.lut_cache_size)
+def get_window_lut(dtype: str, window: Window):
+    dtype = numpy.dtype(dtype)
+    values = numpy.arange(2 ** (dtype.itemsize * 8), dtype=numpy.int64)
+    if dtype.kind == 'i':
+        values = values.astype(f'u{dtype.itemsize}').view(f'i{dtype.itemsize}')
+    lut = get_windowed(values, window)
+    lut.flags.writeable = False
+    return lut
+
+
+# raw pixels -> 8 bit, written straight into out
+def apply_window(pixels: numpy.ndarray, window: Window, out: Optional[numpy.ndarray] = None):
+    if out is None:
+        out = numpy.empty(pixels.shape, numpy.uint8)
+    if pixels.dtype.kind in 'ui' and pixels.dtype.itemsize <= 2:
+        lut = get_window_lut(pixels.dtype.str, window)
+        indexs = pixels.view(pixels.dtype.str.replace('i', 'u'))
+        for row in range(0, pixels.shape[0], chunk_rows):
+            numpy.take(lut, indexs[row: row + chunk_rows], out=out[row: row + chunk_rows], mode='clip')
+    else:
+        for row in range(0, pixels.shape[0], chunk_rows):
+            out[row: row + chunk_rows] = get_windowed(pixels[row: row + chunk_rows], window)
+    return out
+
+
+# windowed 8 bit pixels in the channel order the model is fed: grayscale as is, RGB as BGR
+def to_model_img(mat: numpy.ndarray):
+    return numpy.ascontiguousarray(mat[..., ::-1]) if mat.ndim == 3 else mat
+
+
+# the first frame through the file's own window, as the app shows it when opened
+def read_model_img(path: str):
+    dcm = read(path)
+    pixels = get_frames(dcm, path)[0]
+    return to_model_img(apply_window(pixels, get_window(dcm, pixels)))
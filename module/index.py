@@ -0,0 +1,65 @@
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+# uniform grid over image coordinates: cell - indexs
+# coordinates are read through get_point, a point is removed before they change and added after
+class PointGrid:
+    def __init__(self, cell_size: float, get_point: Callable[[int], Tuple[float, float]]):
+        self.cell_size = cell_size
+        self.get_point = get_point
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+
+    def get_cell(self, x: float, y: float):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def add(self, index: int):
+        self.cells.setdefault(self.get_cell(*self.get_point(index)), set()).add(index)
+
+    def remove(self, index: int):
+        cell = self.get_cell(*self.get_point(index))
+        self.cells[cell].discard(index)
+        if not self.cells[cell]:
+            self.cells.pop(cell)
+
+    def clear(self):
+        self.cells.clear()
+
+    # the closest index strictly within radius, only cells overlapping the radius are visited
+    def get_nearest(self, x: float, y: float, radius: float):
+        left, top = self.get_cell(x - radius, y - radius)
+        right, bottom = self.get_cell(x + radius, y + radius)
+        distance = radius
+        nearest: Optional[int] = None
+        for i in range(left, right + 1):
+            for j in range(top, bottom + 1):
+                for index in self.cells.get((i, j), ()):
+                    px, py = self.get_point(index)
+                    if (dis := ((px - x) ** 2 + (py - y) ** 2) ** 0.5) < distance:
+                        distance = dis
+                        nearest = index
+        return nearest
+
+
+# kind - a: index_a - keys of the lines, angles or circles through a
+class Adjacency:
+    def __init__(self):
+        self.keys: Dict[str, Dict[int, Set[Tuple[int, ...]]]] = dict(line={}, angle={}, circle={})
+
+    def add(self, kind: str, key: Tuple[int, ...]):
+        for index in key:
+            self.keys[kind].setdefault(index, set()).add(key)
+
+    def remove(self, kind: str, key: Tuple[int, ...]):
+        for index in key:
+            if keys := self.keys[kind].get(index):
+                keys.discard(key)
+                if not keys:
+                    self.keys[kind].pop(index)
+
+    # a copy, safe to mutate the index while iterating it
+    def get(self, kind: str, index: int):
+        return set(self.keys[kind].get(index, ()))
+
+    def clear(self):
+        for keys in self.keys.values():
+            keys.clear()
@@ -0,0 +1,68 @@
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QPainter
+from PyQt5.QtWidgets import QGraphicsItem, QGraphicsScene, QStyleOptionGraphicsItem, QWidget
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+
+# kind, key: ('point', a), ('line', (a, b)), ('angle', (a, b, c)), ('circle', (a, b))
+Label = Tuple[str, Union[int, Tuple[int, ...]]]
+
+# later kinds are drawn above earlier ones
+label_kinds = ('point', 'line', 'angle', 'circle')
+
+
+# draw(painter) paints the label, draw(None) only measures it
+class LabelItem(QGraphicsItem):
+    def __init__(self, draw: Callable[[Optional[QPainter]], QRectF]):
+        super().__init__()
+        self.draw = draw
+        self.rect = QRectF()
+        self.sync()
+
+    def sync(self):
+        self.prepareGeometryChange()
+        self.rect = self.draw(None)
+        self.update()
+
+    def boundingRect(self):
+        return self.rect
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        self.draw(painter)
+
+
+class LabelLayer:
+    def __init__(self, scene: QGraphicsScene, draw: Callable[[Optional[QPainter], Label], QRectF]):
+        self.scene = scene
+        self.draw = draw
+        self.items: Dict[Label, LabelItem] = {}
+
+    def add(self, label: Label):
+        item = LabelItem(lambda painter: self.draw(painter, label))
+        item.setZValue(label_kinds.index(label[0]) + 1)
+        self.scene.addItem(item)
+        self.items[label] = item
+
+    def remove(self, label: Label):
+        if item := self.items.pop(label, None):
+            self.scene.removeItem(item)
+
+    # only the given labels are touched
+    def sync(self, labels: Iterable[Label]):
+        for label in labels:
+            if item := self.items.get(label):
+                item.sync()
+            else:
+                self.add(label)
+
+    # the layer ends up holding exactly the given labels
+    def reset(self, labels: Iterable[Label]):
+        labels = list(labels)
+        for label in set(self.items).difference(labels):
+            self.remove(label)
+        self.sync(labels)
+
+    def clear(self):
+        for label in list(self.items):
+            self.remove(label)
@@ -0,0 +1,198 @@
+from module import utils
+from module.config import config
+from module.index import Adjacency, PointGrid
+import numpy
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+point_dtype = numpy.dtype([('id', numpy.int64), ('xy', numpy.float64, (2,)), ('color', numpy.uint16)])
+line_dtype = numpy.dtype([('ids', numpy.int64, (2,)), ('color', numpy.uint16)])
+angle_dtype = numpy.dtype([('ids', numpy.int64, (3,)), ('color', numpy.uint16)])
+circle_dtype = line_dtype
+
+
+# rows of a structured array addressed by key, removal swaps the last row in
+class Table:
+    def __init__(self, dtype: numpy.dtype, capacity: int = 16):
+        self.data = numpy.zeros(capacity, dtype)
+        self.size = 0
+        self.rows: Dict[Hashable, int] = {}
+        self.keys: List[Hashable] = []
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key: Hashable):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(list(self.keys))
+
+    @property
+    def array(self):
+        return self.data[:self.size]
+
+    def get(self, key: Hashable):
+        return self.data[self.rows[key]]
+
+    def set(self, key: Hashable, row: tuple):
+        if key not in self.rows:
+            if self.size == len(self.data):
+                self.data = numpy.resize(self.data, 2 * len(self.data))
+            self.rows[key] = self.size
+            self.keys.append(key)
+            self.size += 1
+        self.data[self.rows[key]] = row
+
+    def pop(self, key: Hashable):
+        row = self.rows.pop(key)
+        value = self.data[row].copy()
+        last = self.size - 1
+        if row != last:
+            self.data[row] = self.data[last]
+            self.keys[row] = self.keys[last]
+            self.rows[self.keys[row]] = row
+        self.keys.pop()
+        self.size -= 1
+        return value
+
+    def clear(self):
+        self.size = 0
+        self.rows.clear()
+        self.keys.clear()
+
+
+# points in src coordinates, lines, angles and circles by point ids, colors as palette indexs
+class AnnotationStore:
+    def __init__(self, palette: Optional[List[str]] = None):
+        self.palette: List[str] = list(palette if palette else config.color_list)
+        self.points = Table(point_dtype)
+        self.labels = dict(line=Table(line_dtype), angle=Table(angle_dtype), circle=Table(circle_dtype))
+        self.grid = PointGrid(config.grid_cell_size, self.get_point)
+        self.adjacency = Adjacency()
+
+    def get_color_index(self, color: str):
+        if color not in self.palette:
+            self.palette.append(color)
+        return self.palette.index(color)
+
+    def has_point(self, index: int):
+        return index in self.points
+
+    def get_point_ids(self):
+        return list(self.points)
+
+    def get_point(self, index: int):
+        x, y = self.points.get(index)['xy']
+        return float(x), float(y)
+
+    def get_point_color(self, index: int):
+        return self.palette[self.points.get(index)['color']]
+
+    def get_new_index(self):
+        return int(self.points.array['id'].max()) + 1 if len(self.points) else 1
+
+    def set_point(self, index: int, x: float, y: float, color: str):
+        if index in self.points:
+            self.grid.remove(index)
+        self.points.set(index, (index, (x, y), self.get_color_index(color)))
+        self.grid.add(index)
+
+    def move_point(self, index: int, x: float, y: float):
+        self.set_point(index, x, y, self.get_point_color(index))
+
+    def set_point_color(self, index: int, color: str):
+        self.set_point(index, *self.get_point(index), color)
+
+    def get_nearest_point(self, x: float, y: float, radius: float):
+        return self.grid.get_nearest(x, y, radius)
+
+    # the point and every label through it
+    def remove_point(self, index: int):
+        for kind in self.labels:
+            for key in self.adjacency.get(kind, index):
+                self.remove_label(kind, key)
+        self.grid.remove(index)
+        self.points.pop(index)
+
+    # lines, angles and circles through the point follow the new index
+    def rename_point(self, index: int, new_index: int):
+        x, y = self.get_point(index)
+        color = self.get_point_color(index)
+        renamed: List[Tuple[str, Tuple[int, ...], str]] = []
+        for kind in self.labels:
+            for key in self.adjacency.get(kind, index):
+                renamed.append((kind, self.get_new_key(kind, key, index, new_index), self.remove_label(kind, key)))
+        self.grid.remove(index)
+        self.points.pop(index)
+        self.set_point(new_index, x, y, color)
+        for kind, key, label_color in renamed:
+            self.set_label(kind, key, label_color)
+
+    @staticmethod
+    def get_new_key(kind: str, key: Tuple[int, ...], index: int, new_index: int):
+        if kind == 'line':
+            return utils.get_line_key(new_index, key[0] + key[1] - index)
+        if kind == 'angle':
+            if index == key[1]:
+                return key[0], new_index, key[2]
+            return utils.get_angle_key(new_index, key[1], key[0] + key[2] - index)
+        return (new_index, key[1]) if index == key[0] else (key[0], new_index)
+
+    def has_label(self, kind: str, key: Tuple[int, ...]):
+        return key in self.labels[kind]
+
+    def get_label_keys(self, kind: str):
+        return list(self.labels[kind])
+
+    def get_label_color(self, kind: str, key: Tuple[int, ...]):
+        return self.palette[self.labels[kind].get(key)['color']]
+
+    def get_labels_of(self, kind: str, index: int):
+        return self.adjacency.get(kind, index)
+
+    def set_label(self, kind: str, key: Tuple[int, ...], color: str):
+        self.labels[kind].set(key, (key, self.get_color_index(color)))
+        self.adjacency.add(kind, key)
+
+    def remove_label(self, kind: str, key: Tuple[int, ...]):
+        self.adjacency.remove(kind, key)
+        return self.palette[self.labels[kind].pop(key)['color']]
+
+    def clear(self):
+        self.points.clear()
+        for table in self.labels.values():
+            table.clear()
+        self.grid.clear()
+        self.adjacency.clear()
+
+    # xy of the given point ids, any shape
+    def get_xy(self, ids: numpy.ndarray):
+        point_ids = self.points.array['id']
+        sorter = numpy.argsort(point_ids)
+        rows = sorter[numpy.searchsorted(point_ids, ids, sorter=sorter)]
+        return self.points.array['xy'][rows]
+
+    # distance from (x, y) to every point
+    def get_distances(self, x: float, y: float):
+        return utils.get_distances(self.points.array['xy'], numpy.array((x, y)))
+
+    # length of every line, in mm if spacing is given
+    def get_line_lengths(self, spacing: Optional[Tuple[float, float]] = None):
+        xy = self.get_xy(self.labels['line'].array['ids'])
+        if spacing:
+            xy = xy * spacing
+        return utils.get_distances(xy[:, 0], xy[:, 1])
+
+    # degree of every ∠abc
+    def get_angle_degrees(self):
+        xy = self.get_xy(self.labels['angle'].array['ids'])
+        return utils.get_degrees(xy[:, 0], xy[:, 1], xy[:, 2])
+
+    # left, top, right, bottom of all points
+    def get_bounding_box(self):
+        if not len(self.points):
+            return None
+        xy = self.points.array['xy']
+        (left, top), (right, bottom) = xy.min(axis=0), xy.max(axis=0)
+        return float(left), float(top), float(right), float(bottom)
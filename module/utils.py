@@ -1,14 +1,17 @@
 import json
 import math
+from module import dicom
 from module.config import config
 import numpy
 import os
-from PIL import Image
-from pydicom import dcmread, FileDataset
-from pydicom.dicomdir import DicomDir
 from PyQt5.QtCore import QPointF, QRectF
-from PyQt5.QtGui import QPixmap
-from typing import Optional, Union
+from PyQt5.QtGui import QImage
+from typing import Optional, TYPE_CHECKING, Union
+
+# pydicom is only imported once a DICOM file is opened
+if TYPE_CHECKING:
+    from pydicom import FileDataset
+    from pydicom.dicomdir import DicomDir
 
 
 def is_file_exists(path: str):
@@ -23,7 +26,7 @@ def is_file_writable(path: str):
     return os.access(path, os.W_OK)
 
 
-def get_attr(dcm: Union[FileDataset, DicomDir], name: str):
+def get_attr(dcm: Union['FileDataset', 'DicomDir'], name: str):
     attr = getattr(dcm, name, None)
     if attr is not None:
         attr = str(attr).strip(' \t\n\r')
@@ -65,27 +68,59 @@ def to_age(age: Optional[str]):
         return num + '天'
 
 
-def get_dcm_img_with_info(path: str):
-    dcm = dcmread(path)
-
-    # 16 bit -> 8 bit
-    low = numpy.min(dcm.pixel_array)
-    upp = numpy.max(dcm.pixel_array)
-    mat = numpy.floor_divide(dcm.pixel_array, (upp - low + 1) / 256)
-
-    img = Image.fromarray(mat.astype(numpy.uint8)).toqpixmap()
-    info = dict(
+def get_dcm_fields(dcm: Union['FileDataset', 'DicomDir']):
+    return dict(
         患者ID=get_attr(dcm, 'PatientID'), 姓名=get_attr(dcm, 'PatientName'),
         出生日期=to_date(get_attr(dcm, 'PatientBirthDate')), 性别=to_sex(get_attr(dcm, 'PatientSex')),
         体重=get_attr(dcm, 'PatientWeigh'), 检查开始日期=to_date(get_attr(dcm, 'StudyDate')),
         检查日期=to_date(get_attr(dcm, 'SeriesDate')), 检查时患者年龄=to_age(get_attr(dcm, 'PatientAge')),
         检查部位=get_attr(dcm, 'BodyPartExamined')
     )
+
+
+def get_dcm_info(dcm: Union['FileDataset', 'DicomDir']):
+    info = get_dcm_fields(dcm)
     for attr in info.keys():
         if not info[attr]:
             info[attr] = '（不详）'
-    pixel_spacing = (dcm.PixelSpacing[0], dcm.PixelSpacing[1]) if hasattr(dcm, 'PixelSpacing') else None
-    return img, '---\n\n'.join([f'{key}: {val}\n\n' for key, val in info.items()]), pixel_spacing
+    return '---\n\n'.join([f'{key}: {val}\n\n' for key, val in info.items()])
+
+
+# patient info read from the header only, PixelData is never touched
+def get_dcm_header_info(path: str):
+    return get_dcm_info(dicom.read_header(path))
+
+
+def get_pixel_spacing(dcm: Union['FileDataset', 'DicomDir']):
+    return (dcm.PixelSpacing[0], dcm.PixelSpacing[1]) if hasattr(dcm, 'PixelSpacing') else None
+
+
+# 8 bit grayscale (samples = 1) or RGB (samples = 3) QImage sharing the memory of a uint8 array
+# rows of buffer may be padded past width * samples, the padding is skipped through the stride
+# the array is kept alive by the image, img.mat is the (height, width[, samples]) view of its pixels
+def to_qimage(buffer: numpy.ndarray, width: Optional[int] = None, samples: int = 1):
+    buffer = numpy.ascontiguousarray(buffer, numpy.uint8)
+    height = buffer.shape[0]
+    width = width or buffer.shape[1] // samples
+    img_format = QImage.Format_RGB888 if samples == 3 else QImage.Format_Grayscale8
+    img = QImage(buffer.data, width, height, buffer.strides[0], img_format)
+    img.buffer = buffer
+    shape, strides = ((height, width, samples), (buffer.strides[0], samples, 1)) if samples > 1 else \
+        ((height, width), (buffer.strides[0], 1))
+    img.mat = numpy.ndarray(shape, numpy.uint8, buffer, 0, strides)
+    return img
+
+
+# pixels are windowed straight into a buffer whose rows are padded to 4 bytes, as QImage expects
+# (height, width) grayscale or (height, width, 3) RGB pixels
+def get_windowed_qimage(pixels: numpy.ndarray, window: dicom.Window):
+    height, width = pixels.shape[:2]
+    samples = pixels.shape[2] if pixels.ndim == 3 else 1
+    if samples not in (1, 3):
+        raise ValueError(f'{samples} samples per pixel are not supported')
+    img = to_qimage(numpy.empty((height, (width * samples + 3) // 4 * 4), numpy.uint8), width, samples)
+    dicom.apply_window(pixels, window, img.mat)
+    return img
 
 
 def rename_path_ext(path: str, ext: str):
@@ -107,6 +142,16 @@ def get_parent_dir(path: str):
     return os.path.dirname(os.path.abspath(path))
 
 
+def get_abs_path(path: str):
+    return os.path.normpath(os.path.abspath(path))
+
+
+# DICOM files directly in dir, by name
+def get_dcm_paths(dir: str):
+    names = sorted(name for name in os.listdir(dir) if os.path.splitext(name)[1].lower() == '.dcm')
+    return [get_abs_path(os.path.join(dir, name)) for name in names]
+
+
 def load_from_json(path):
     with open(path, 'r') as file:
         return json.load(file)
@@ -117,6 +162,60 @@ def save_json_file(data: dict, path: str):
         json.dump(data, file, indent=config.indent)
 
 
+# batch geometry: every argument is an array of points with shape (..., 2)
+def get_midpoints(a: numpy.ndarray, b: numpy.ndarray):
+    return (a + b) / 2
+
+
+def get_distances(a: numpy.ndarray, b: numpy.ndarray):
+    return numpy.maximum(numpy.hypot(a[..., 0] - b[..., 0], a[..., 1] - b[..., 1]), config.eps)
+
+
+def get_radii(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray):
+    return numpy.minimum(get_distances(b, a), get_distances(b, c)) * config.ratio_to_radius
+
+
+def get_dis_points(a: numpy.ndarray, b: numpy.ndarray, dis: Union[float, numpy.ndarray]):
+    ratio = numpy.asarray(dis / get_distances(a, b))[..., numpy.newaxis]
+    return a + (b - a) * ratio
+
+
+def get_arc_midpoints(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray):
+    return get_dis_points(
+        b, get_midpoints(get_dis_points(b, a, config.base), get_dis_points(b, c, config.base)), get_radii(a, b, c)
+    )
+
+
+# ba · bc
+def get_dots(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray):
+    ba = a - b
+    bc = c - b
+    return ba[..., 0] * bc[..., 0] + ba[..., 1] * bc[..., 1]
+
+
+# ba × bc
+def get_crosses(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray):
+    ba = a - b
+    bc = c - b
+    return ba[..., 0] * bc[..., 1] - bc[..., 0] * ba[..., 1]
+
+
+def get_degrees(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray):
+    return numpy.degrees(numpy.arccos(numpy.clip(get_dots(a, b, c) / get_distances(b, a) / get_distances(b, c), -1, 1)))
+
+
+# ab: da · x + db · y + dc = 0
+def get_foot_points(a: numpy.ndarray, b: numpy.ndarray, c: numpy.ndarray):
+    da = a[..., 1] - b[..., 1]
+    db = b[..., 0] - a[..., 0]
+    dc = -da * a[..., 0] - db * a[..., 1]
+    norm = da * da + db * db
+    return numpy.stack((
+        (db * db * c[..., 0] - da * db * c[..., 1] - da * dc) / norm,
+        (da * da * c[..., 1] - da * db * c[..., 0] - db * dc) / norm
+    ), axis=-1)
+
+
 def get_index_shift(a: QPointF):
     return QPointF(a.x() + config.index_shifting, a.y() - config.index_shifting)
 
@@ -249,10 +348,8 @@ def is_on_segment(a: QPointF, b: QPointF, c: QPointF):
     return min(a.x(), b.x()) < c.x() + config.eps and c.x() < max(a.x(), b.x()) + config.eps
 
 
-def get_cv2_img(pixmap: QPixmap):
-    img = pixmap.toImage()
-    shape = (img.height(), img.bytesPerLine() * 8 // img.depth(), 4)
+# BGRA view of a Format_RGB32 QImage, valid as long as img is alive and unchanged
+def get_cv2_img(img: QImage):
     ptr = img.bits()
     ptr.setsize(img.byteCount())
-    cv2_img = numpy.array(ptr, numpy.uint8).reshape(shape)
-    return cv2_img[..., :3]
+    return numpy.ndarray((img.height(), img.width(), 4), numpy.uint8, ptr, 0, (img.bytesPerLine(), 4, 1))
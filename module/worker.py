@@ -0,0 +1,176 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from module import dicom, utils
+from module.cache import LRUCache
+import numpy
+from PyQt5.QtCore import pyqtSignal, QObject
+from PyQt5.QtGui import QImage
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+
+# imports torch and loads the weights, run as a task
+def load_model():
+    from model import test
+    test.get_session()
+
+
+# img is the QImage mat is a view of, if any, kept alive until done
+def auto_get_points(mat: numpy.ndarray, img: Optional[QImage] = None):
+    from model import test
+    return test.auto_get_points(mat)
+
+
+# named background tasks, results are delivered in the UI thread
+# a task replaces the running one of the same name, whose result is then dropped
+class TaskRunner(QObject):
+    # future finished, emitted from the worker thread and received in the thread of the runner
+    done = pyqtSignal(object)
+    # the running tasks changed
+    changed = pyqtSignal()
+
+    def __init__(self, workers: int, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.workers = workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # name - future, message
+        self.tasks: Dict[str, Tuple[Future, str]] = {}
+        # future - name, on result, on error
+        self.callbacks: Dict[Future, Tuple[str, Callable[[Any], None], Optional[Callable[[BaseException], None]]]] = {}
+        self.done.connect(self.deliver)
+
+    def submit(self, name: str, message: str, on_result: Callable[[Any], None],
+               on_error: Optional[Callable[[BaseException], None]], fn: Callable, *args) -> Future:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, 'task')
+        return self.watch(name, message, self.executor.submit(fn, *args), on_result, on_error)
+
+    # a future from elsewhere (a prefetched frame), a finished one is delivered at once
+    def watch(self, name: str, message: str, future: Future, on_result: Callable[[Any], None],
+              on_error: Optional[Callable[[BaseException], None]] = None) -> Future:
+        self.cancel(name)
+        self.callbacks[future] = name, on_result, on_error
+        if future.done():
+            self.deliver(future)
+            return future
+        self.tasks[name] = future, message
+        future.add_done_callback(self.done.emit)
+        self.changed.emit()
+        return future
+
+    # the result of a cancelled task is never delivered, a task not started yet does not run
+    def cancel(self, name: str):
+        if name not in self.tasks:
+            return None
+        future, _ = self.tasks.pop(name)
+        self.callbacks.pop(future, None)
+        future.cancel()
+        self.changed.emit()
+
+    def deliver(self, future: Future):
+        if (callbacks := self.callbacks.pop(future, None)) is None:
+            return None
+        name, on_result, on_error = callbacks
+        if name in self.tasks and self.tasks[name][0] is future:
+            self.tasks.pop(name)
+            self.changed.emit()
+        if future.cancelled():
+            return None
+        if (error := future.exception()) is not None:
+            if on_error:
+                on_error(error)
+        else:
+            on_result(future.result())
+
+    def is_running(self, name: str):
+        return name in self.tasks
+
+    # message of the latest running task
+    def get_message(self):
+        return next(reversed(self.tasks.values()))[1] if self.tasks else None
+
+    def shutdown(self):
+        for name in list(self.tasks):
+            self.cancel(name)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+# one windowed frame of a DICOM file, img shares memory with its 8 bit pixels
+# QImage is safe to build off the UI thread, the QPixmap is made from it in the UI thread
+class Frame(NamedTuple):
+    path: str
+    frames: numpy.ndarray
+    index: int
+    window: dicom.Window
+    img: QImage
+    info: str
+    spacing: Optional[Tuple[float, float]]
+
+    # (height, width) grayscale or (height, width, 3) RGB
+    @property
+    def mat(self):
+        return self.img.mat
+
+
+# the file's own window if window is None
+def read_frame(path: str, index: int = 0, window: Optional[dicom.Window] = None):
+    dcm = dicom.read(path)
+    info, spacing = utils.get_dcm_info(dcm), utils.get_pixel_spacing(dcm)
+    frames = dicom.get_frames(dcm, path)
+    index = min(index, len(frames) - 1)
+    window = window if window else dicom.get_window(dcm, frames[index])
+    return Frame(path, frames, index, window, utils.get_windowed_qimage(frames[index], window), info, spacing)
+
+
+# another frame of the same file
+def window_frame(frame: Frame, index: int, window: dicom.Window):
+    img = utils.get_windowed_qimage(frame.frames[index], window)
+    return frame._replace(index=index, window=window, img=img)
+
+
+# futures of recently requested frames, only touched from the UI thread
+# a hit returns the finished (or still running) future, failed ones are submitted again
+# finished frames are kept within max_bytes, a decoded study is counted once however many of its frames are kept
+class FramePrefetcher:
+    def __init__(self, capacity: int, workers: int, max_bytes: int):
+        self.cache = LRUCache(capacity)
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, key: Hashable, fn: Callable[..., Frame], *args) -> Future:
+        future: Optional[Future] = self.cache.get(key)
+        if future is None or future.cancelled() or future.done() and future.exception() is not None:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers, 'frame')
+            future = self.executor.submit(fn, *args)
+            self.cache.put(key, future)
+        self.trim()
+        return future
+
+    # the oldest finished frames over max_bytes are dropped, the latest one is always kept
+    # memory-mapped frames cost no memory of their own
+    def trim(self):
+        counted = set()
+        total = 0
+        for key, future in reversed(list(self.cache.data.items())):
+            if not future.done() or future.cancelled() or future.exception() is not None:
+                continue
+            frame: Frame = future.result()
+            size = frame.img.buffer.nbytes
+            if id(frame.frames) not in counted and not isinstance(frame.frames, numpy.memmap):
+                size += frame.frames.nbytes
+            if total and total + size > self.max_bytes:
+                self.cache.pop(key)
+            else:
+                counted.add(id(frame.frames))
+                total += size
+
+    def clear(self):
+        for future in self.cache.data.values():
+            future.cancel()
+        self.cache.clear()
+
+    def shutdown(self):
+        self.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
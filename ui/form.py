@@ -143,6 +143,12 @@ class Ui_form(object):
         form.addToolBar(QtCore.Qt.TopToolBarArea, self.tool_bar)
         self.load_img_btn = QtWidgets.QAction(form)
         self.load_img_btn.setObjectName("load_img_btn")
+        self.open_dir_btn = QtWidgets.QAction(form)
+        self.open_dir_btn.setObjectName("open_dir_btn")
+        self.prev_img_btn = QtWidgets.QAction(form)
+        self.prev_img_btn.setObjectName("prev_img_btn")
+        self.next_img_btn = QtWidgets.QAction(form)
+        self.next_img_btn.setObjectName("next_img_btn")
         self.delete_img_btn = QtWidgets.QAction(form)
         self.delete_img_btn.setObjectName("delete_img_btn")
         self.save_img_btn = QtWidgets.QAction(form)
@@ -168,6 +174,9 @@ class Ui_form(object):
         self.menu_3.addAction(self.export_all_btn)
         self.menu_3.addAction(self.export_pivots_btn)
         self.menu.addAction(self.load_img_btn)
+        self.menu.addAction(self.open_dir_btn)
+        self.menu.addAction(self.prev_img_btn)
+        self.menu.addAction(self.next_img_btn)
         self.menu.addAction(self.delete_img_btn)
         self.menu.addAction(self.save_img_btn)
         self.menu.addAction(self.import_btn)
@@ -186,6 +195,10 @@ class Ui_form(object):
         self.tool_bar.addAction(self.dec_size_btn)
         self.tool_bar.addSeparator()
         self.tool_bar.addAction(self.reset_size_btn)
+        self.tool_bar.addSeparator()
+        self.tool_bar.addAction(self.prev_img_btn)
+        self.tool_bar.addSeparator()
+        self.tool_bar.addAction(self.next_img_btn)
 
         self.retranslateUi(form)
         QtCore.QMetaObject.connectSlotsByName(form)
@@ -204,6 +217,12 @@ class Ui_form(object):
         self.tool_bar.setWindowTitle(_translate("form", "toolBar"))
         self.load_img_btn.setText(_translate("form", "新建"))
         self.load_img_btn.setShortcut(_translate("form", "Ctrl+N"))
+        self.open_dir_btn.setText(_translate("form", "打开文件夹"))
+        self.open_dir_btn.setShortcut(_translate("form", "Ctrl+O"))
+        self.prev_img_btn.setText(_translate("form", "上一张"))
+        self.prev_img_btn.setShortcut(_translate("form", "Ctrl+PgUp"))
+        self.next_img_btn.setText(_translate("form", "下一张"))
+        self.next_img_btn.setShortcut(_translate("form", "Ctrl+PgDown"))
         self.delete_img_btn.setText(_translate("form", "删除"))
         self.delete_img_btn.setShortcut(_translate("form", "Ctrl+D"))
         self.save_img_btn.setText(_translate("form", "保存"))